@@ -0,0 +1,108 @@
+"""Decklist line parser throughput, against the parsec grammar it replaced.
+
+    python -m benchmarks.decklist_parser [--lines N]
+
+parsec is only needed for the comparison, it's not a dependency anymore."""
+import argparse
+import random
+import time
+
+from proxygen.decklists.decklist import parse_line
+
+try:
+    import parsec
+except ImportError:
+    parsec = None
+
+
+def list_to_str(ls):
+    return ''.join(ls)
+
+def _parsec_line_parser():
+    face_parsec = parsec.between(parsec.string("["), parsec.string("]"), parsec.many1(parsec.none_of("]"))).parsecmap(list_to_str)
+
+    @parsec.generate
+    def cstm_line_parsec():
+        yield parsec.string("cstm:")
+        yield parsec.spaces()
+        count = yield parsec.natural
+        yield parsec.spaces()
+        name = yield parsec.many1(parsec.none_of("["))
+        front_face = yield face_parsec
+        yield parsec.spaces()
+        back_face = yield parsec.optional(face_parsec)
+        return (True, count, list_to_str(name).strip(), list_to_str(front_face), list_to_str(back_face) if back_face else None)
+
+    @parsec.generate
+    def plain_line_parsec():
+        count = yield parsec.natural
+        yield parsec.optional(parsec.string("x"))
+        yield parsec.spaces()
+        name = yield parsec.many1(parsec.none_of("("))
+        set_code = yield parsec.between(parsec.string("("), parsec.string(")"), parsec.many1(parsec.none_of(")")))
+        yield parsec.spaces()
+        collector_number = yield parsec.many1(parsec.any())
+        return (False, count, list_to_str(name).strip(), list_to_str(set_code), list_to_str(collector_number).strip())
+
+    line_parsec = cstm_line_parsec.choice(plain_line_parsec)
+
+    def parse(line):
+        try:
+            return parsec.parse(line_parsec, line)
+        except parsec.ParseError:
+            return None
+    return parse
+
+_templates = [
+    "{n} {name} ({set}) {cn}\n",
+    "{n}x {name} ({set}) {cn}\n",
+    "{n} {name} // {name} ({set}) {cn}\n",
+    "{n} {name} ({set}) {set}-{cn} *F*\n",
+    "cstm: {n} {name} [custom/{name}.png]\n",
+    "cstm: {n} {name} [custom/{name}.png] [custom/{name} back.png]\n",
+    "// {name}\n",
+    "\n",
+    "Sideboard\n",
+    "{n} {name}\n",
+    "{n} ({set}) {cn}\n",
+    "cstm: {n} {name} [unterminated\n",
+]
+
+def make_lines(count, seed=0):
+    rng = random.Random(seed)
+    words = ["Lightning", "Bolt", "Sol", "Ring", "Wooded", "Ridgeline", "Æther", "Vial", "Command", "Tower"]
+    lines = []
+    for _ in range(count):
+        name = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        template = rng.choice(_templates)
+        lines.append(template.format(n=rng.randint(1, 20), name=name, set=rng.choice(["blc", "M21", "plst", "2xm"]), cn=rng.randint(1, 400)))
+    return lines
+
+def measure(parse, lines):
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    elapsed = time.perf_counter() - start
+    return len(lines) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=100_000)
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    print(f"regex:  {measure(parse_line, lines):12,.0f} lines/s")
+
+    if parsec is None:
+        print("parsec isn't installed, skipping the comparison")
+        return
+
+    parse_parsec = _parsec_line_parser()
+    mismatches = [line for line in lines if parse_line(line) != parse_parsec(line)]
+    print(f"parsec: {measure(parse_parsec, lines):12,.0f} lines/s")
+    print(f"{len(mismatches)} lines parsed differently")
+    for line in mismatches[:10]:
+        print(repr(line), parse_line(line), parse_parsec(line))
+
+if __name__ == "__main__":
+    main()
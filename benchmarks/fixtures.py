@@ -0,0 +1,99 @@
+"""Synthetic inputs for the benchmarks, deterministic for a given seed so runs can be compared."""
+from __future__ import annotations
+
+from pathlib import Path
+import random
+import json
+
+
+sets = ("lea", "m21", "blc", "plst", "2xm", "znr", "mh2")
+type_lines = ("Creature — Goblin", "Instant", "Sorcery", "Artifact", "Enchantment", "Legendary Creature — Elf", "Land")
+words = ("Lightning", "Bolt", "Sol", "Ring", "Wooded", "Ridgeline", "Aether", "Vial", "Command", "Tower", "Goblin", "Guide", "Mox", "Pearl")
+
+def card_id(i: int) -> str:
+    return f"00000000-0000-4000-8000-{i:012d}"
+
+def card_index(card_id: str) -> int:
+    return int(card_id.rsplit("-", 1)[1])
+
+def _image_uris(i: int, face: str = "front") -> dict:
+    # same shape as scryfall's, get_image names the cached file after the last path parts
+    uri = f"https://cards.scryfall.io/png/{face}/{i % 16:x}/{i % 13:x}/{card_id(i)}.png?1700000000"
+    return {"small": uri, "normal": uri, "large": uri, "png": uri}
+
+def make_cards(count: int = 20_000, seed: int = 0) -> list[dict]:
+    """Bulk data shaped cards. Every 11th one is a transform card, every 20th a basic land.
+    Each card also carries the kind of fields the real bulk file has and we throw away."""
+    rng = random.Random(seed)
+    cards = []
+    for i in range(count):
+        name = " ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) + f" {i}"
+        card = {
+            "object": "card",
+            "id": card_id(i),
+            "oracle_id": f"10000000-0000-4000-8000-{i:012d}",
+            "name": name,
+            "lang": "en",
+            "set": sets[i % len(sets)],
+            "collector_number": str(i),
+            "type_line": "Basic Land — Mountain" if i % 20 == 0 else rng.choice(type_lines),
+            "layout": "normal",
+            "image_uris": _image_uris(i),
+            "mana_cost": "{R}",
+            "oracle_text": "Deal 3 damage to any target. " * rng.randint(1, 4),
+            "legalities": {fmt: "legal" for fmt in ("standard", "modern", "legacy", "vintage", "commander")},
+            "prices": {"usd": f"{rng.random() * 20:.2f}", "eur": None},
+            "artist": "Synthetic",
+        }
+        if i % 11 == 0:
+            del card["image_uris"], card["oracle_id"]
+            card["layout"] = "transform"
+            card["name"] = f"{name} // Back {i}"
+            card["card_faces"] = [
+                {"object": "card_face", "name": name, "oracle_id": f"10000000-0000-4000-8000-{i:012d}", "type_line": "Creature — Human", "image_uris": _image_uris(i)},
+                {"object": "card_face", "name": f"Back {i}", "type_line": "Creature — Werewolf", "image_uris": _image_uris(i, "back")},
+            ]
+        cards.append(card)
+    return cards
+
+def bulk_json(cards: list[dict]) -> bytes:
+    # one card per line like the real file
+    return ("[\n" + ",\n".join(json.dumps(card, separators=(",", ":")) for card in cards) + "\n]").encode()
+
+def make_decklist(cards: list[dict], entries: int, seed: int = 0) -> str:
+    """Arena style decklist with entries distinct cards, with a few playsets and comments mixed in like exported decks."""
+    rng = random.Random(seed)
+    lines = ["// Deck"]
+    for card in rng.sample(cards, entries):
+        count = rng.choice((1, 1, 1, 2, 4))
+        lines.append(f"{count} {card['name']} ({card['set'].upper()}) {card['collector_number']}")
+    return "\n".join(lines) + "\n"
+
+def make_card_pngs(directory: str | Path, count: int = 64, size: tuple[int, int] = (745, 1040), seed: int = 0) -> list[Path]:
+    """count distinct card sized RGBA PNGs with rounded (transparent) corners and some noise so they don't compress to nothing."""
+    from PIL import Image, ImageDraw
+    import numpy as np
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = directory / f"card{i:03d}.png"
+        paths.append(path)
+        if path.is_file():
+            continue
+        # seeded per image so a half generated directory ends up the same as a fresh one
+        rng = np.random.default_rng((seed, i))
+        base = rng.integers(0, 256, 3)
+        noise = rng.integers(-24, 24, (size[1], size[0], 3))
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        im = Image.fromarray(pixels, "RGB").convert("RGBA")
+        draw = ImageDraw.Draw(im)
+        draw.rectangle((30, 60, size[0] - 30, size[1] // 2), fill=tuple(int(c) for c in 255 - base))
+        draw.text((40, 20), f"card {i}", fill=(0, 0, 0))
+        mask = Image.new("L", size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, size[0] - 1, size[1] - 1), radius=36, fill=255)
+        im.putalpha(mask)
+        # real scans are barely compressible anyway, no point spending time on it
+        im.save(path, compress_level=1)
+    return paths
@@ -0,0 +1,96 @@
+"""Cold start cost of the CLI, per subcommand.
+
+    python -m benchmarks.import_time [--repeat N] [--json]
+
+Every scenario runs in a fresh interpreter and times only its own imports (interpreter startup isn't ours to cut).
+Exits with 1 if a scenario goes over its budget or loads a module it shouldn't, so it can run in CI."""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+root = Path(__file__).resolve().parent.parent
+
+_heavy = ("numpy", "fpdf", "PIL", "tqdm", "requests", "more_itertools", "scryfall")
+_network = ("requests", "scryfall")
+
+# name: (code to time, modules it must not load, budget in ms)
+# budgets are a few times what a laptop measures, they're there to catch someone importing numpy at the top of main.py again
+scenarios = {
+    "help": (
+        "import contextlib, io, sys, runpy\n"
+        "sys.argv = ['main.py', '--help']\n"
+        "with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):\n"
+        "    runpy.run_path('main.py', run_name='__main__')",
+        _heavy,
+        50,
+    ),
+    "stitch (png)": ("import main, proxygen.print_cards", _network + ("fpdf",), 400),
+    "stitch (pdf)": ("import main, proxygen.print_cards, proxygen.pdf", _network, 500),
+    "deck": ("import main, proxygen.print_cards, proxygen.pdf, proxygen.decks", (), 700),
+    "batch": ("import main, proxygen.batch, proxygen.pdf", (), 700),
+    "serve": ("import main, proxygen.server, proxygen.pdf", (), 700),
+}
+
+_runner = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+exec({code!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+def run_once(code):
+    result = subprocess.run(
+        [sys.executable, "-c", _runner.format(root=str(root), code=code)],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+def measure(code, forbidden, repeat):
+    runs = [run_once(code) for _ in range(repeat)]
+    modules = set(runs[-1]["modules"])
+    loaded = sorted(name for name in forbidden if name in modules)
+    return {
+        "median_ms": statistics.median(run["seconds"] for run in runs) * 1000,
+        "min_ms": min(run["seconds"] for run in runs) * 1000,
+        "modules": len(modules),
+        "forbidden_loaded": loaded,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON instead of a table")
+    args = parser.parse_args()
+
+    results = {}
+    for name, (code, forbidden, budget) in scenarios.items():
+        result = measure(code, forbidden, args.repeat)
+        result["budget_ms"] = budget
+        result["ok"] = result["median_ms"] <= budget and not result["forbidden_loaded"]
+        results[name] = result
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'scenario':<14} {'median':>9} {'min':>9} {'budget':>8} {'modules':>8}")
+        for name, result in results.items():
+            line = f"{name:<14} {result['median_ms']:7.1f}ms {result['min_ms']:7.1f}ms {result['budget_ms']:6}ms {result['modules']:8}"
+            if result["forbidden_loaded"]:
+                line += "  loaded " + ", ".join(result["forbidden_loaded"])
+            elif not result["ok"]:
+                line += "  over budget"
+            print(line)
+
+    sys.exit(0 if all(result["ok"] for result in results.values()) else 1)
+
+if __name__ == "__main__":
+    main()
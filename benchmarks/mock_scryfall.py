@@ -0,0 +1,181 @@
+"""A local stand in for api.scryfall.com and cards.scryfall.io, so benchmarks don't depend on (or hammer) the real thing.
+
+Serves /bulk-data (with an ETag), the bulk file itself, POST /cards/collection and card images.
+MockClient sends every scryfall request to it instead.
+
+Files and images honor Range requests. To test downloads against a bad connection, set on the MockScryfall:
+drops (the next that many file responses are cut off after drop_after bytes), ignore_range, corrupt
+(the next that many file responses are garbage) and wrong_total (the next that many ranged responses claim a
+bigger file than there is)."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import threading
+import socket
+import json
+
+import scryfall
+from benchmarks.fixtures import bulk_json, card_index
+
+
+scryfall_hosts = ("https://api.scryfall.com", "https://cards.scryfall.io")
+updated_at = "2024-01-01T10:00:00.000+00:00"
+
+class MockClient(scryfall.Client):
+    def __init__(self, port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.base = f"http://127.0.0.1:{port}"
+
+    def request(self, method: str, url: str, **kwargs):
+        for host in scryfall_hosts:
+            if url.startswith(host):
+                url = self.base + url[len(host):]
+                break
+        return super().request(method, url, **kwargs)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        mock = self.server.mock
+        path = self.path.split("?")[0]
+        endpoint = path.split("/")[1]
+        mock.hits[endpoint] = mock.hits.get(endpoint, 0) + 1
+        if path == "/bulk-data":
+            etag = f'"{updated_at}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304)
+                return
+            body = json.dumps({"object": "list", "has_more": False, "data": [{
+                "object": "bulk_data",
+                "type": "default_cards",
+                "updated_at": updated_at,
+                "download_uri": "https://api.scryfall.com/file/default-cards-20240101100000.json",
+            }]}).encode()
+            self._send(200, body, headers={"ETag": etag})
+        elif path.startswith("/file/"):
+            self._send_file(mock.bulk, "application/json")
+        elif path.startswith("/png/"):
+            image = mock.images[card_index(Path(path).stem) % len(mock.images)]
+            self._send_file(image, "image/png")
+        else:
+            self._send(404, b'{"object": "error"}')
+
+    def _send_file(self, body: bytes, content_type: str):
+        mock = self.server.mock
+        with mock.lock:
+            corrupt = mock.corrupt > 0
+            mock.corrupt -= corrupt
+            drop = mock.drops > 0
+            mock.drops -= drop
+        if corrupt:
+            body = bytes(reversed(body))
+
+        range_header = self.headers.get("Range")
+        if range_header is None or mock.ignore_range:
+            status, start, headers = 200, 0, {}
+        else:
+            mock.ranges.append(range_header)
+            start = int(range_header.removeprefix("bytes=").split("-")[0])
+            if start >= len(body):
+                self._send(416, headers={"Content-Range": f"bytes */{len(body)}"})
+                return
+            total = len(body)
+            with mock.lock:
+                if mock.wrong_total > 0:
+                    mock.wrong_total -= 1
+                    total += 1024
+            status, headers = 206, {"Content-Range": f"bytes {start}-{len(body) - 1}/{total}"}
+
+        if not drop:
+            self._send(status, body[start:], content_type, headers)
+            return
+        # promise the whole thing, send some of it and hang up
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body) - start))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body[start:start + mock.drop_after])
+        self.wfile.flush()
+        self.close_connection = True
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+    def do_POST(self):
+        mock = self.server.mock
+        mock.hits["cards"] = mock.hits.get("cards", 0) + 1
+        if self.path != "/cards/collection":
+            self._send(404, b'{"object": "error"}')
+            return
+        identifiers = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["identifiers"]
+        data, not_found = [], []
+        for identifier in identifiers:
+            card = mock.find(identifier)
+            if card is None:
+                not_found.append(identifier)
+            else:
+                data.append(card)
+        self._send(200, json.dumps({"object": "list", "data": data, "not_found": not_found}).encode())
+
+class MockScryfall:
+    """Serves cards and images on a random local port until closed. Use as a context manager."""
+
+    def __init__(self, cards: list[dict], images: list[str | Path]):
+        self.cards = cards
+        self.bulk = bulk_json(cards)
+        self.images = [Path(image).read_bytes() for image in images]
+        self.hits = {}
+        # see the module docstring
+        self.drops = 0
+        self.drop_after = 4096
+        self.ignore_range = False
+        self.corrupt = 0
+        self.wrong_total = 0
+        # every Range header we've been sent
+        self.ranges = []
+        self.lock = threading.Lock()
+        self._by_id = {card["id"]: card for card in cards}
+        self._by_print = {(card["set"], card["collector_number"]): card for card in cards}
+        self._by_name = {}
+        for card in cards:
+            self._by_name.setdefault(scryfall.canonic_card_name(card["name"]), card)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def find(self, identifier: dict) -> dict | None:
+        if "id" in identifier:
+            return self._by_id.get(identifier["id"])
+        if "set" in identifier:
+            return self._by_print.get((identifier["set"].lower(), identifier["collector_number"].lower()))
+        return self._by_name.get(scryfall.canonic_card_name(identifier["name"]))
+
+    def client(self, **kwargs) -> MockClient:
+        return MockClient(self.port, **kwargs)
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,273 @@
+"""End to end benchmark: bulk database, card lookups, decklist parsing, image fetching and rendering.
+
+    python -m benchmarks.pipeline [--output results.json] [--baseline old.json]
+
+Everything runs against synthetic data (benchmarks.fixtures) served by a local mock scryfall (benchmarks.mock_scryfall),
+in a scratch directory instead of the real caches. Every stage runs in its own fresh process, so peak RSS is per stage.
+Rendering is measured for each deck size and mode (normal, paired, double_sided, split_sides, bleed) into PDF,
+and into PNG pages for the decks in --png-decks, always with a cold render cache.
+
+Results are JSON. With --baseline, any stage more than --tolerance slower, bigger in memory or bigger on disk
+than the same stage in the baseline is listed and the exit status is 1."""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import multiprocessing
+import argparse
+import platform
+import tempfile
+import resource
+import shutil
+import json
+import time
+import sys
+import os
+
+from benchmarks.fixtures import make_cards, make_card_pngs, make_decklist
+
+
+modes = ("normal", "paired", "double_sided", "split_sides", "bleed")
+
+def _setup(env):
+    # point everything at the scratch directory and the mock server, this runs in the stage's own process
+    import scryfall
+    import scryfall.scryfall as scryfall_module
+    from scryfall.file_cache import FileCache
+    from benchmarks.mock_scryfall import MockClient
+    from proxygen.render_cache import render_cache
+
+    scryfall_module.file_cache = FileCache(Path(env["workdir"]) / "scryfall_cache")
+    scryfall.set_client(MockClient(env["port"]))
+    render_cache.directory = Path(env["workdir"]) / "render_cache" / env["stage_key"]
+
+def _deck_path(env, deck):
+    return Path(env["workdir"]) / "decks" / f"{deck}.txt"
+
+def _bulk_database(env):
+    import scryfall.scryfall as scryfall_module
+
+    def run():
+        return scryfall_module._get_database().path.stat().st_size
+    return run
+
+def _get_cards(env):
+    import scryfall
+    from benchmarks.fixtures import card_id, sets
+
+    cards = env["cards"]
+    # open the database outside the measurement, that's bulk_database's job
+    scryfall.get_cards(id=card_id(0))
+
+    def run():
+        for i in range(0, cards, max(1, cards // 500)):
+            scryfall.get_cards(id=card_id(i))
+            scryfall.get_cards(set=sets[i % len(sets)], collector_number=str(i))
+            scryfall.card_by_id()[card_id(i)]
+        # not indexed, so it's a scan
+        scryfall.get_cards(set="lea", layout="transform")
+        return None
+    return run
+
+def _parse_decklist(env, deck):
+    from proxygen.decklists import parse_decklist
+    import scryfall.scryfall as scryfall_module
+
+    scryfall_module._get_database()
+
+    def run():
+        parse_decklist(_deck_path(env, deck))
+        return None
+    return run
+
+def _deck_images(env, deck):
+    from proxygen.decklists import parse_decklist
+    from proxygen.decks import deck_images
+
+    images, counts, _ = deck_images(parse_decklist(_deck_path(env, deck)), basic_lands=True)
+    return images, counts
+
+def _fetch_images(env, deck):
+    from proxygen.decks import fetch_images
+
+    images, _ = _deck_images(env, deck)
+
+    def run():
+        fetched = fetch_images(images)
+        return sum(os.path.getsize(image) for image in {image for card in fetched for image in card})
+    return run
+
+def _render(env, deck, mode, format):
+    from proxygen.decks import fetch_images
+    from proxygen.print_cards import print_cards
+    from proxygen.units import mm
+
+    images, counts = _deck_images(env, deck)
+    images = fetch_images(images)
+
+    output_dir = Path(env["workdir"]) / "output" / env["stage_key"]
+    output_dir.mkdir(parents=True)
+    if format == "pdf":
+        output, back_output = output_dir / "front.pdf", output_dir / "back.pdf"
+    else:
+        output, back_output = output_dir / "front%03d.png", output_dir / "back%03d.png"
+    options = {
+        "counts": counts,
+        "show_guide": True,
+        "jobs": env["jobs"],
+        "dfc_mode": "normal" if mode == "bleed" else mode,
+        "back_output": str(back_output) if mode == "split_sides" else None,
+        "bleed": 1 * mm if mode == "bleed" else 0,
+    }
+
+    def run():
+        print_cards(images, str(output), **options)
+        return sum(path.stat().st_size for path in output_dir.iterdir())
+    return run
+
+stages = {
+    "bulk_database": _bulk_database,
+    "get_cards": _get_cards,
+    "parse_decklist": _parse_decklist,
+    "fetch_images": _fetch_images,
+    "render": _render,
+}
+
+def _peak_rss_kb(who):
+    if who == resource.RUSAGE_SELF:
+        # linux keeps ru_maxrss across exec, so a stage would start at the driver's peak (fixtures, mock server images).
+        # VmHWM belongs to the process image and starts over
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+    peak = resource.getrusage(who).ru_maxrss
+    # bytes on macos, kilobytes everywhere else
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def run_stage(env, stage, params):
+    _setup(env)
+    run = stages[stage](env, **params)
+    start = time.perf_counter()
+    output_bytes = run()
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        # worker processes (image resizing) only count once they've exited, which print_cards waits for.
+        # they're forked from the stage, so they start from its peak and not the driver's
+        "peak_rss_kb": max(_peak_rss_kb(resource.RUSAGE_SELF), _peak_rss_kb(resource.RUSAGE_CHILDREN)),
+        "output_bytes": output_bytes,
+    }
+
+def stage_key(result):
+    return "/".join(str(result[key]) for key in ("stage", "deck", "mode", "format") if result.get(key) is not None)
+
+def plan(decks, png_decks, selected_modes):
+    yield "bulk_database", {}
+    yield "get_cards", {}
+    for deck in decks:
+        yield "parse_decklist", {"deck": deck}
+    for deck in decks:
+        yield "fetch_images", {"deck": deck}
+    for deck in decks:
+        for mode in selected_modes:
+            yield "render", {"deck": deck, "mode": mode, "format": "pdf"}
+            if deck in png_decks:
+                yield "render", {"deck": deck, "mode": mode, "format": "png"}
+
+def run(workdir, cards=20_000, decks=(60, 100, 1000), png_decks=(60,), selected_modes=modes, pngs=64, jobs=None, quiet=True):
+    from benchmarks.mock_scryfall import MockScryfall
+
+    workdir = Path(workdir)
+    card_list = make_cards(cards)
+    images = make_card_pngs(workdir / "pngs", pngs)
+    (workdir / "decks").mkdir(parents=True, exist_ok=True)
+    for deck in decks:
+        _deck_path({"workdir": workdir}, deck).write_text(make_decklist(card_list, deck, seed=deck), encoding="utf-8")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with MockScryfall(card_list, images) as mock:
+        for stage, params in plan(decks, png_decks, selected_modes):
+            result = {"stage": stage, **params}
+            env = {"workdir": str(workdir), "port": mock.port, "cards": cards, "jobs": jobs, "stage_key": stage_key(result).replace("/", "_")}
+            with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_quiet if quiet else None) as executor:
+                result.update(executor.submit(run_stage, env, stage, params).result())
+            print(f"{stage_key(result):<36} {result['seconds']:8.3f}s {result['peak_rss_kb'] / 1024:8.1f}MiB {result['output_bytes'] or 0:>14,}B", file=sys.stderr)
+            results.append(result)
+    return results
+
+def _quiet():
+    # progress bars and "Writing to" lines would drown out the results
+    sys.stdout = open(os.devnull, "w")
+    sys.stderr = open(os.devnull, "w")
+
+def compare(results, baseline, tolerance):
+    """Stages that got worse than baseline by more than tolerance (0.25 is 25%)."""
+    previous = {stage_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(stage_key(result))
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_rss_kb", "output_bytes"):
+            if result[metric] is not None and old[metric] and result[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{stage_key(result)} {metric}: {old[metric]:.6g} -> {result[metric]:.6g}")
+    return regressions
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=20_000, help="Cards in the synthetic bulk data")
+    parser.add_argument("--decks", type=_int_list, default=[60, 100, 1000], help="Decklist sizes (entries), comma separated")
+    parser.add_argument("--png-decks", type=_int_list, default=[60], help="Decklist sizes to also render to PNG pages, which is a lot slower")
+    parser.add_argument("--modes", type=lambda v: v.split(","), default=list(modes), help="Render modes, comma separated")
+    parser.add_argument("--pngs", type=int, default=64, help="Distinct card images")
+    parser.add_argument("--jobs", type=int, default=None, help="Passed to print_cards")
+    parser.add_argument("--workdir", default=None, help="Scratch directory, kept afterwards if given")
+    parser.add_argument("--output", default=None, help="Write the results here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="Results from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    unknown = set(args.modes) - set(modes)
+    if unknown:
+        parser.error(f"unknown modes {', '.join(sorted(unknown))}")
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="proxygen_bench_"))
+    try:
+        results = run(workdir, args.cards, args.decks, args.png_decks, args.modes, args.pngs, args.jobs)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "workdir")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
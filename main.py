@@ -1,204 +1,198 @@
-import math
-import itertools
 import os
 import argparse
-import csv
-import requests
-import collections
-import time
-import json
-import scryfall
-from tqdm import tqdm
-from proxygen.print_cards import print_cards, page_sizes, units, inch
-import more_itertools
-import itertools
-import numpy as np
-from proxygen.decklists import CustomCard, Card, parse_any
-from proxygen.decklists.archidekt import parse_decklist as download_archidekt
-from proxygen.decklists.moxfield import parse_decklist as download_moxfield
+from proxygen.units import layout_sizes
+
+# everything heavy (numpy, fpdf, PIL, requests, scryfall...) is imported where it's used,
+# so --help and stitch mode don't pay for what they don't need. see benchmarks/import_time.py
+
+def start_profile(path, fmt):
+    import atexit
+    import sys
+    import tracing
+
+    recorder = tracing.Recorder().start()
+
+    # atexit so the modes that exit() early still get written
+    def write():
+        recorder.stop()
+        recorder.write(path, fmt)
+        print(recorder.report(), file=sys.stderr)
+        print(f"Profile written to {path}", file=sys.stderr)
+    atexit.register(write)
+
+def cache_size(value):
+    # scryfall is only imported when the option is given, and it reads the cache settings when first used, not now
+    from scryfall.file_cache import parse_bytes
+
+    try:
+        size = parse_bytes(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {value!r}, expected something like 4G or 500M")
+    return str(size)
+
+def bounded_int(minimum, maximum=None):
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+        if maximum is not None and not minimum <= number <= maximum:
+            raise argparse.ArgumentTypeError(f"must be from {minimum} to {maximum}")
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}")
+        return number
+    return parse
+
+def main():
+    parser = argparse.ArgumentParser(prog="Cards To Print")
+    parser.add_argument("--output", help="Output File. Inferred to be PDF or PNG based on extension")
+    parser.add_argument("--page-size", help="Page size (may be a descriptor or NxNunit. unit may be in/cm/mm/pt)")
+    parser.add_argument("--card-size", help="Card size")
+    parser.add_argument("--card-spacing", help="Card spacing. May be Nunit. Unit may be in/cm/mm/pt")
+    parser.add_argument("--bleed-edge", "--bleed", help="Use bleed edge. Set to Nunit. Unit may be in/cm/mm/pt")
+    parser.add_argument("--guide", help="Draw guide lines for cutting with a rotary trimmer or guillotine paper cutter.", action="store_true")
+    parser.add_argument("--image-compression", choices=["flate", "jpeg"], default="flate", help="How card images are compressed in PDFs. flate is lossless, jpeg is much smaller.")
+    parser.add_argument("--jpeg-quality", type=bounded_int(1, 95), default=90, help="JPEG quality (1-95) when using --image-compression jpeg, or when outputting JPEG/WebP pages")
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(10), metavar="0-9", help="PNG compression level for image output. Lower is faster but bigger.")
+    parser.add_argument("--profile", metavar="FILE", default=None, help="Record where the time goes and write it to FILE. A summary is printed when done.")
+    parser.add_argument("--profile-format", choices=["json", "chrome"], default="json", help="json, or chrome for chrome://tracing and Perfetto")
+    parser.add_argument("--cache-dir", default=None, help="Where downloaded cards and resized images are kept. Defaults to PROXYGEN_CACHE_DIR, or your temp directory.")
+    parser.add_argument("--cache-max-size", type=cache_size, default=None, help="Downloads past this (like 4G or 500M) get deleted, least recently used first. Default 8G, 0 for no limit.")
+    parser.add_argument("--cache-max-entries", type=bounded_int(0), default=None, help="Same, for the number of downloaded files. Default 50000, 0 for no limit.")
+    parser.add_argument("--jobs", "-j", type=bounded_int(1), default=None, help="Number of processes used to resize card images. Defaults to the number of CPUs.")
+
+    subparsers = parser.add_subparsers(dest="subparser")
+
+    stitch_parser = subparsers.add_parser("stitch", help="Stitch Mode (from images, no duplicates)")
+    stitch_parser.add_argument(dest="input", nargs='+', help="Input Files")
+
+    deck_parser = subparsers.add_parser("deck", help="Deck Mode (from file or URL, download and cache from scryfall)")
+    deck_parser.add_argument(dest="deck", help="Deck file or archidekt URL")
+    deck_parser.add_argument("--include-basic-lands", dest="basic_lands", action="store_true", help="By default, basic lands are excluded. Use this to include them.")
+    deck_parser.add_argument("--pair-dfc", dest="pair_dfc", action="store_true", help="Moves DFCs so that they are side by side and can be folded together.")
+    deck_parser.add_argument("--double-sided-mode", dest="double_sided", action="store_true", help="Make actual DFCs with double sided pages.")
+    deck_parser.add_argument("--ignore-counts", dest="ignore_counts", action="store_true", help="Print one copy of every card, no matter how many the decklist has.")
+    deck_parser.add_argument("--back-output", dest="back_output", default=None, help="Split double sided face backs to a second file so that you can print double sided on a single sided printer.")
+
+    batch_parser = subparsers.add_parser("batch", help="Batch Mode (many decks at once, --output is a pattern where {name} is the deck file name)")
+    batch_parser.add_argument(dest="input", help="Directory of decklists, or a JSON manifest of {\"deck\", \"output\", \"back_output\"} entries")
+    batch_parser.add_argument("--include-basic-lands", dest="basic_lands", action="store_true", help="By default, basic lands are excluded. Use this to include them.")
+    batch_parser.add_argument("--pair-dfc", dest="pair_dfc", action="store_true", help="Moves DFCs so that they are side by side and can be folded together.")
+    batch_parser.add_argument("--double-sided-mode", dest="double_sided", action="store_true", help="Make actual DFCs with double sided pages.")
+    batch_parser.add_argument("--ignore-counts", dest="ignore_counts", action="store_true", help="Print one copy of every card, no matter how many the decklist has.")
+    batch_parser.add_argument("--back-output", dest="back_output", default=None, help="Pattern for split double sided face backs, like --output.")
+    batch_parser.add_argument("--workers", type=bounded_int(1), default=None, help="Number of decks rendered at once. Defaults to the number of CPUs.")
+
+    serve_parser = subparsers.add_parser("serve", help="Server Mode (render decklists POSTed to /render, see proxygen/server.py)")
+    serve_parser.add_argument("--socket", default=None, help="Listen on this Unix socket instead of a TCP port")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=bounded_int(1), default=None, help="Number of PDFs rendered at once. Defaults to the number of CPUs.")
+
+    args = parser.parse_args()
+
+    if args.subparser is None:
+        print("No mode specified")
+        parser.print_usage()
+        exit(1)
+
+    if args.profile:
+        start_profile(args.profile, args.profile_format)
+
+    # through the environment so worker processes pick them up too, nothing that reads them has been imported yet
+    if args.cache_dir is not None:
+        os.environ["PROXYGEN_CACHE_DIR"] = os.path.abspath(args.cache_dir)
+    if args.cache_max_size is not None:
+        os.environ["PROXYGEN_CACHE_MAX_SIZE"] = args.cache_max_size
+    if args.cache_max_entries is not None:
+        os.environ["PROXYGEN_CACHE_MAX_ENTRIES"] = str(args.cache_max_entries)
+
+    if args.subparser == "serve":
+        from proxygen.server import serve
+
+        serve(args.socket, args.host, args.port, args.workers)
+        return
+
+    if args.output is None:
+        parser.error("the following arguments are required: --output")
+
+    back_output = None
+
+    page_size, card_size, card_spacing, bleed_edge = layout_sizes(args.page_size, args.card_size, args.card_spacing, args.bleed_edge)
+
+    failed = []
 
-def parse_size(size):
-    x, remainder = more_itertools.before_and_after(lambda x : x != 'x', iter(size))
-    x = float(''.join(x))
-   
-    next(remainder)
-    y, remainder = more_itertools.before_and_after(lambda x : x.isnumeric() or x == '.', remainder)
-    y = float(''.join(y))
-
-    unit = ''.join(remainder)
-
-    if not unit:
-        unit = 'in'
-    
-    if unit not in units:
-        raise ValueError(f"Invalid unit {unit}")
-
-    unit_scale = units[unit]
-
-    return np.array([x, y]) * unit_scale
-
-def parse_length(size):
-    x, unit = more_itertools.before_and_after(lambda x : x.isnumeric() or x == '.', iter(size))
-    x = float(''.join(x))
-
-    unit = ''.join(unit)
-
-    if not unit:
-        unit = 'in'
-
-    if unit not in units:
-        raise ValueError(f"Invalid unit {unit}")
-
-    return x * units[unit]
-
-parser = argparse.ArgumentParser(prog="Cards To Print")
-parser.add_argument("--output", help="Output File. Inferred to be PDF or PNG based on extension", required=True)
-parser.add_argument("--page-size", help="Page size (may be a descriptor or NxNunit. unit may be in/cm/mm/pt)")
-parser.add_argument("--card-size", help="Card size")
-parser.add_argument("--card-spacing", help="Card spacing. May be Nunit. Unit may be in/cm/mm/pt")
-parser.add_argument("--bleed-edge", "--bleed", help="Use bleed edge. Set to Nunit. Unit may be in/cm/mm/pt")
-parser.add_argument("--guide", help="Draw guide lines for cutting with a rotary trimmer or guillotine paper cutter.", action="store_true")
-
-subparsers = parser.add_subparsers(dest="subparser")
-
-stitch_parser = subparsers.add_parser("stitch", help="Stitch Mode (from images, no duplicates)")
-stitch_parser.add_argument(dest="input", nargs='+', help="Input Files")
-
-deck_parser = subparsers.add_parser("deck", help="Deck Mode (from file or URL, download and cache from scryfall)")
-deck_parser.add_argument(dest="deck", help="Deck file or archidekt URL")
-deck_parser.add_argument("--include-basic-lands", dest="basic_lands", action="store_true", help="By default, basic lands are excluded. Use this to include them.")
-deck_parser.add_argument("--pair-dfc", dest="pair_dfc", action="store_true", help="Moves DFCs so that they are side by side and can be folded together.")
-deck_parser.add_argument("--double-sided-mode", dest="double_sided", action="store_true", help="Make actual DFCs with double sided pages.")
-deck_parser.add_argument("--back-output", dest="back_output", default=None, help="Split double sided face backs to a second file so that you can print double sided on a single sided printer.")
-
-args = parser.parse_args()
-
-back_output = None
-
-if args.page_size:
-    if args.page_size.lower() in page_sizes:
-        page_size = np.array(page_sizes[args.page_size.lower()])
-    else:
-        page_size = parse_size(args.page_size)
-else:
-    page_size = np.array(page_sizes["letter"])
-
-if args.card_size:
-    card_size = parse_size(args.card_size)
-else:
-    card_size = np.array([2.5 * inch, 3.5 * inch])
-
-if args.card_spacing:
-    card_spacing = parse_length(args.card_spacing)
-else:
-    card_spacing = 0.1 * inch
-
-if args.bleed_edge:
-    bleed_edge = parse_length(args.bleed_edge)
-else:
-    bleed_edge = 0
-
-
-
-
-
-failed = []
-
-
-mode = "normal"
-images = []
-
-
-if args.subparser == "stitch":
-    for file in args.input:
-        if not os.path.exists(file):
-            failed.append("couldn't find {file}".format(file=file))
-    images = [[file] for file in args.input]
-elif args.subparser == "deck":
-    back_output = args.back_output
-    if args.deck.startswith("https://"):
-        if args.deck.startswith("https://archidekt.com/decks/"):
-            archidekt_id = args.deck[8:].split("/")[2]
-            # heh.......
-            print("Downloading archidekt deck, this may take a while...")
-            decklist = download_archidekt(archidekt_id)
-        elif args.deck.startswith("https://moxfield.com/decks/"):
-            moxfield_id = args.deck.split("/")[-1]
-            print("Downloading moxfield deck, this may take a while...")
-            decklist = download_moxfield(moxfield_id)
-    else:
-        decklist = parse_any(args.deck)
 
-    for card in tqdm(decklist.cards, desc="Fetching card images"):
-        if isinstance(card, CustomCard):
-            da_uris = []
-            failed_front = False
-            failed_back = False
-            if os.path.exists(card.front_face):
-                da_uris.append(card.front_face)
+    mode = "normal"
+    images = []
+    counts = None
+
+
+    if args.subparser == "stitch":
+        for file in args.input:
+            if not os.path.exists(file):
+                failed.append("couldn't find {file}".format(file=file))
+        images = [[file] for file in args.input]
+    elif args.subparser == "batch":
+        mode = "normal"
+        if args.double_sided:
+            mode = "double_sided"
+        elif args.pair_dfc:
+            mode = "paired"
+
+        from proxygen.batch import load_manifest, run_batch
+
+        try:
+            jobs = load_manifest(args.input, args.output, args.back_output)
+        except ValueError as e:
+            parser.error(str(e))
+        failed = run_batch(jobs, basic_lands=args.basic_lands, ignore_counts=args.ignore_counts, dfc_mode=mode, workers=args.workers, papersize=page_size, cardsize=card_size, card_spacing=card_spacing, bleed=bleed_edge, show_guide=args.guide, image_compression=args.image_compression, jpeg_quality=args.jpeg_quality, compress_level=args.compress_level)
+        # nobody is around to answer y/n for hundreds of decks, just report
+        for deck, problems in failed.items():
+            print(f"{deck}:")
+            for problem in problems:
+                print(f"    {problem}")
+        exit(1 if failed else 0)
+    elif args.subparser == "deck":
+        from proxygen.decks import load_decklist, deck_images, fetch_images
+
+        back_output = args.back_output
+        decklist = load_decklist(args.deck)
+        images, counts, failed = deck_images(decklist, args.basic_lands, args.ignore_counts)
+        images = fetch_images(images)
+
+        mode = "normal"
+        if args.back_output:
+            mode = "split_sides"
+        elif args.double_sided:
+            mode = "double_sided"
+        elif args.pair_dfc:
+            mode = "paired"
+
+    if failed:
+        print("Some downloads failed, so the PDF will be incomplete.")
+        for f in failed:
+            print(f)
+        print("Do you want to try generating the PDF anyway? (y/n)")
+        while True:
+            response = input()
+            if response == "y":
+                print("Continuing...")
+                break
+            elif response == "n":
+                print("Exiting...")
+                exit(0)
             else:
-                failed_front = True
-            if card.back_face:
-                if os.path.exists(card.back_face):
-                    da_uris.append(card.back_face)
-                else:
-                    failed_back = True
-            
-            if failed_front or failed_back:
-                err_fmt = ""
-                if failed_front and failed_back:
-                    err_fmt = "{name}: failed to locate front and back face"
-                elif failed_front:
-                    err_fmt = "{name}: failed to locate front face"
-                else:
-                    err_fmt = "{name}: failed to locate back face"
-                
-                failed.append(err_fmt.format(name=card.name))
-
-                if failed_front:
-                    failed.append("    front should be at {front}".format(front=card.front_face))
-                if failed_back:
-                    failed.append("    back should be at {back}".format(back=card.back_face))
-
-                
-            if len(da_uris) == 0:
-                continue
-        else:
-            if not args.basic_lands and "Basic Land" in card["type_line"]:
-                continue
-            # currently assumes download will succeed which is usually true
-            # this doesn't (and can't) handle if we can't find a card because its mispelled or similar
-            da_uris = [scryfall.get_image(uris["png"]) for uris in card.image_uris]
-        images.append(da_uris) 
+                print("Please respond with y/n.")
 
-    mode = "normal"
-    if args.back_output:
-        mode = "split_sides"
-    elif args.double_sided:
-        mode = "double_sided"
-    elif args.pair_dfc:
-        mode = "paired"
-else:
-    print("No mode specified")
-    parser.print_usage()
-    exit(1)
-
-if failed:
-    print("Some downloads failed, so the PDF will be incomplete.")
-    for f in failed:
-        print(f)
-    print("Do you want to try generating the PDF anyway? (y/n)")
-    while True:
-        response = input()
-        if response == "y":
-            print("Continuing...")
-            break
-        elif response == "n":
-            print("Exiting...")
-            exit(0)
-        else:
-            print("Please respond with y/n.")
-
-
-
-print_cards(images, args.output, dfc_mode=mode, papersize=page_size, cardsize=card_size, card_spacing=card_spacing, bleed=bleed_edge, back_output=back_output, show_guide=args.guide)
+
+    from proxygen.print_cards import print_cards
+
+    try:
+        print_cards(images, args.output, counts=counts, dfc_mode=mode, papersize=page_size, cardsize=card_size, card_spacing=card_spacing, bleed=bleed_edge, back_output=back_output, show_guide=args.guide, jobs=args.jobs, image_compression=args.image_compression, jpeg_quality=args.jpeg_quality, compress_level=args.compress_level)
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+if __name__ == "__main__":
+    main()
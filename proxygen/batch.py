@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import os
+
+from proxygen.decks import load_decklist, deck_images, fetch_many_images
+from proxygen.print_cards import print_cards
+import tracing
+
+
+decklist_suffixes = (".txt", ".csv")
+
+@dataclass
+class BatchJob:
+    # decklist file or archidekt/moxfield URL
+    deck: str
+    output: str
+    back_output: str | None = None
+
+def load_manifest(path: str | Path, output: str = "{name}.pdf", back_output: str | None = None) -> list[BatchJob]:
+    """Jobs from a directory of decklists or a JSON manifest.
+
+    For a directory, output and back_output are patterns where {name} is the decklist file name without its extension.
+    A manifest is a list of {"deck": ..., "output": ..., "back_output": ...} objects, relative paths are relative to the manifest.
+    """
+    path = Path(path)
+    if path.is_dir():
+        # otherwise every deck would be written to the same file
+        for option, pattern in (("--output", output), ("--back-output", back_output)):
+            if pattern is not None and "{name}" not in pattern:
+                raise ValueError(f"{option} must contain {{name}} for a directory of decklists, like {{name}}.pdf")
+        return [
+            BatchJob(
+                str(deck),
+                output.format(name=deck.stem),
+                None if back_output is None else back_output.format(name=deck.stem),
+            )
+            for deck in sorted(path.iterdir())
+            if deck.suffix.lower() in decklist_suffixes
+        ]
+
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    def relative_to_manifest(file):
+        # absolute paths stay as they are, joining onto one just gives it back
+        return None if file is None else str(path.parent / file)
+
+    jobs = []
+    for entry in entries:
+        deck = entry["deck"]
+        if not deck.startswith("https://"):
+            deck = relative_to_manifest(deck)
+        jobs.append(BatchJob(deck, relative_to_manifest(entry["output"]), relative_to_manifest(entry.get("back_output"))))
+    return jobs
+
+def _render(trace: bool, images, output, **options):
+    if not trace:
+        print_cards(images, output, **options)
+        return None
+    # the parent's recorder doesn't exist in here, send the events back with the result
+    with tracing.Recorder() as recorder:
+        print_cards(images, output, **options)
+    return recorder.export()
+
+def run_batch(
+        jobs: list[BatchJob],
+        basic_lands: bool = False,
+        ignore_counts: bool = False,
+        dfc_mode: str = "normal",
+        workers: int | None = None,
+        **print_options,
+        ) -> dict[str, list[str]]:
+    """Render every job, sharing the card database and image downloads between them.
+
+    print_options are passed on to print_cards. Returns the problems for every deck that had any,
+    a deck that couldn't be loaded or rendered at all is skipped instead of stopping the batch.
+    """
+    failed = {}
+    loaded = []
+    for job in jobs:
+        try:
+            decklist = load_decklist(job.deck)
+        except Exception as e:
+            failed[job.deck] = [f"couldn't load decklist: {e}"]
+            continue
+        images, counts, deck_failed = deck_images(decklist, basic_lands, ignore_counts)
+        if deck_failed:
+            failed[job.deck] = deck_failed
+        if not images:
+            failed.setdefault(job.deck, []).append("nothing to print")
+            continue
+        loaded.append((job, images, counts))
+
+    # one download pass for everything, so a card shared by a hundred decks is only fetched once
+    download_errors = {}
+    fetched = fetch_many_images([images for _, images, _ in loaded], download_errors)
+
+    # the decks themselves are the parallelism, don't also fan out image resizing inside each one
+    print_options["jobs"] = 1
+    trace = tracing.enabled()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {}
+        for (job, uris, counts), images in zip(loaded, fetched):
+            problems = [f"couldn't download {uri}: {download_errors[uri]}" for card in uris for uri in card if uri in download_errors]
+            if problems:
+                failed.setdefault(job.deck, []).extend(dict.fromkeys(problems))
+                continue
+            mode = "split_sides" if job.back_output else dfc_mode
+            future = executor.submit(
+                _render,
+                trace,
+                images,
+                job.output,
+                counts=counts,
+                dfc_mode=mode,
+                back_output=job.back_output,
+                **print_options,
+            )
+            futures[future] = job
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                exported = future.result()
+            except Exception as e:
+                failed.setdefault(job.deck, []).append(f"couldn't render {job.output}: {e}")
+            else:
+                if exported is not None:
+                    tracing.replay(exported)
+                print(f"Wrote {job.output}")
+
+    return failed
@@ -1,14 +1,17 @@
-import requests
-
 from proxygen.decklists import Decklist
 import scryfall
 
+# batch mode can ask for a lot of decks in a row, be polite
+archidekt_rate_limiter = scryfall.RateLimiter(rate=1)
+
 
 def parse_decklist(archidekt_id: str) -> Decklist:
     decklist = Decklist()
 
 
-    r = requests.get(f"https://archidekt.com/api/decks/{archidekt_id}/", headers=scryfall.headers)
+    with archidekt_rate_limiter:
+        r = scryfall.get_client().get(f"https://archidekt.com/api/decks/{archidekt_id}/")
+    archidekt_rate_limiter.observe(r)
 
     if r.status_code != 200:
         raise ValueError(f"Archidekt returned status code {r.status_code}")
@@ -26,10 +29,9 @@ def parse_decklist(archidekt_id: str) -> Decklist:
         if item["categories"] is not None and len(item["categories"]) > 0 and item["categories"][0] not in in_deck:
             continue
 
-        card = scryfall.get_card(card_name=None, set_id=set_id, collector_number=collector_number)
+        decklist.append_card_identifier(count, {"set": set_id, "collector_number": collector_number})
 
-        decklist.append_card(count, card)
-    
+    decklist.resolve()
     decklist.name = data["name"]
 
     return decklist
@@ -7,8 +7,7 @@ import more_itertools
 import itertools
 import csv
 import scryfall
-import parsec
-from proxygen.util import list_to_str, compose
+import tracing
 
 @dataclass
 class CardLike:
@@ -62,10 +61,33 @@ class Comment:
 class Decklist:
     entries: list[CardLike | Comment] = field(default_factory=list)
     name: str = None
+    # cards added by identifier that haven't been looked up yet
+    unresolved: list[tuple[Card, dict]] = field(default_factory=list, repr=False)
+    # identifiers scryfall didn't know about, their entries are dropped
+    missing: list[dict] = field(default_factory=list, repr=False)
 
     def append_card(self, count: int, card) -> None:
         self.entries.append(Card(count, card))
 
+    def append_card_identifier(self, count: int, identifier: dict) -> None:
+        card = Card(count, None)
+        self.entries.append(card)
+        self.unresolved.append((card, identifier))
+
+    @tracing.traced("decklist.resolve")
+    def resolve(self) -> None:
+        """Look up every card added with append_card_identifier in one go."""
+        if not self.unresolved:
+            return
+        cards = scryfall.resolve_cards([identifier for _, identifier in self.unresolved])
+        for (entry, identifier), card in zip(self.unresolved, cards):
+            entry.card = card
+            if card is None:
+                self.missing.append(identifier)
+        if self.missing:
+            self.entries = [e for e in self.entries if not (isinstance(e, Card) and e.card is None)]
+        self.unresolved.clear()
+
     def append_custom_card(self, count: int, name: str, front_face: Path, back_face: Path | None) -> None:
         self.entries.append(CustomCard(count, name, front_face, back_face))
 
@@ -74,6 +96,8 @@ class Decklist:
 
     def extend(self, other) -> None:
         self.entries.extend(other.entries)
+        self.unresolved.extend(other.unresolved)
+        self.missing.extend(other.missing)
 
     def save(self, file: str | Path, fmt: str = "arena", mode: str = "w") -> None:
         with open(file, mode, encoding="utf-8", newline="") as f:
@@ -96,52 +120,46 @@ class Decklist:
 
 
 
-face_parsec = parsec.between(parsec.string("["), parsec.string("]"), parsec.many1(parsec.none_of("]"))).parsecmap(list_to_str)
-
+# same grammar the old parsec parser had, possessive so nothing gets handed back to the name
+_cstm_line = re.compile(r"cstm:\s*+(\d++)\s*+([^\[]++)\[([^\]]++)\]\s*+(?:\[([^\]]++)\])?")
+_plain_line = re.compile(r"(\d++)x?\s*+([^(]++)\(([^)]++)\)\s*+(.+)", re.DOTALL)
 
-@parsec.generate
-def cstm_line_parsec():
-    yield parsec.string("cstm:")
-    yield parsec.spaces()
-    count = yield parsec.natural
-    yield parsec.spaces()
-    name = yield parsec.many1(parsec.none_of("["))
-    front_face = yield face_parsec
-    yield parsec.spaces()
-    back_face = yield parsec.optional(face_parsec)
-    return (True, count, list_to_str(name).strip(), list_to_str(front_face), list_to_str(back_face) if back_face else None)
+def parse_line(line: str) -> tuple[bool, int, str, str, str | None] | None:
+    """(cstm, count, name, data1, data2) for a card line, None for anything else.
 
+    data1 and data2 are the front and back face for custom cards, and the set code and collector number otherwise."""
+    if line.startswith("cstm:"):
+        match = _cstm_line.match(line)
+        if match is None:
+            return None
+        count, name, front_face, back_face = match.groups()
+        return (True, int(count), name.strip(), front_face, back_face)
 
-@parsec.generate
-def plain_line_parsec():
-    count = yield parsec.natural
-    yield parsec.optional(parsec.string("x"))
-    yield parsec.spaces()
-    name = yield parsec.many1(parsec.none_of("("))
-    set_code = yield parsec.between(parsec.string("("), parsec.string(")"), parsec.many1(parsec.none_of(")")))
-    yield parsec.spaces()
-    collector_number = yield parsec.many1(parsec.any())
-    return (False, count, list_to_str(name).strip(), list_to_str(set_code), list_to_str(collector_number).strip())
+    match = _plain_line.match(line)
+    if match is None:
+        return None
+    count, name, set_code, collector_number = match.groups()
+    return (False, int(count), name.strip(), set_code, collector_number.strip())
 
-
-line_parsec = cstm_line_parsec.choice(plain_line_parsec) 
-# TODO: implement actual look ups
+@tracing.traced("decklist.parse")
 def parse_decklist_stream(stream) -> Decklist:
     decklist = Decklist()
 
     for line in stream:
-        try:
-            cstm, count, name, data1, data2 = parsec.parse(line_parsec, line)
-            if cstm:
-                front_face, back_face = (data1, data2)
-                decklist.append_custom_card(count, name, Path(front_face), Path(back_face) if back_face else None)
-            else:
-                set_code, collector_number = (data1, data2)
-                print(set_code, collector_number)
-                card = scryfall.get_card(card_name=None, set_id=set_code, collector_number=collector_number)
-                decklist.append_card(count, card)
-        except parsec.ParseError:
+        parsed = parse_line(line)
+        if parsed is None:
             decklist.append_comment(line.rstrip())
+            continue
+
+        cstm, count, name, data1, data2 = parsed
+        if cstm:
+            front_face, back_face = (data1, data2)
+            decklist.append_custom_card(count, name, Path(front_face), Path(back_face) if back_face else None)
+        else:
+            set_code, collector_number = (data1, data2)
+            decklist.append_card_identifier(count, {"set": set_code, "collector_number": collector_number})
+
+    decklist.resolve()
 
     return decklist
 
@@ -154,6 +172,7 @@ def parse_decklist(filepath: str | Path) -> Decklist:
 
     return decklist
 
+@tracing.traced("decklist.parse")
 def parse_csv_stream(stream) -> Decklist:
     decklist = Decklist()
 
@@ -167,8 +186,9 @@ def parse_csv_stream(stream) -> Decklist:
 
             decklist.append_custom_card(count, row[1], Path(front_face), Path(back_face) if back_face else None)
         else:
-            card = scryfall.get_card(card_name=None, set_id=row[2], collector_number=row[3])
-            decklist.append_card(count, card)
+            decklist.append_card_identifier(count, {"set": row[2], "collector_number": row[3]})
+
+    decklist.resolve()
 
     return decklist
 
@@ -1,13 +1,17 @@
 from collections.abc import Sequence
 
-import requests
 import scryfall
 from proxygen.decklists import Decklist
 
+# batch mode can ask for a lot of decks in a row, moxfield doesn't like more than about one a second
+moxfield_rate_limiter = scryfall.RateLimiter(rate=1)
+
 def parse_decklist(moxfield_id: str, zones: Sequence[str] = ("commander", "mainboard")):
     decklist = Decklist()
 
-    r = requests.get(f"https://api2.moxfield.com/v3/decks/all/{moxfield_id}", headers=scryfall.headers)
+    with moxfield_rate_limiter:
+        r = scryfall.get_client().get(f"https://api2.moxfield.com/v3/decks/all/{moxfield_id}")
+    moxfield_rate_limiter.observe(r)
 
     if r.status_code != 200:
         raise ValueError(f"Moxfield returned status code {r.status_code}")
@@ -20,8 +24,9 @@ def parse_decklist(moxfield_id: str, zones: Sequence[str] = ("commander", "mainb
         for card in board["cards"].values():
             count = card["quantity"]
             scryfall_id = card["card"]["scryfall_id"]
-            decklist.append_card(count, scryfall.card_by_id()[scryfall_id])
+            decklist.append_card_identifier(count, {"id": scryfall_id})
 
+    decklist.resolve()
     decklist.name = data["name"]
 
     return decklist
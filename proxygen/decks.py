@@ -0,0 +1,115 @@
+import io
+import os
+
+from tqdm import tqdm
+
+import scryfall
+import tracing
+from proxygen.decklists import CustomCard, Decklist, parse_any, parse_csv_stream, parse_decklist_stream
+from proxygen.decklists.archidekt import parse_decklist as download_archidekt
+from proxygen.decklists.moxfield import parse_decklist as download_moxfield
+
+
+# the only places a deck can be downloaded from
+deck_url_prefixes = ("https://archidekt.com/decks/", "https://moxfield.com/decks/")
+
+@tracing.traced("decklist.load")
+def load_decklist(deck: str) -> Decklist:
+    """A decklist from a file, or an archidekt/moxfield URL."""
+    if deck.startswith("https://"):
+        if deck.startswith("https://archidekt.com/decks/"):
+            archidekt_id = deck[8:].split("/")[2]
+            # heh.......
+            print("Downloading archidekt deck, this may take a while...")
+            return download_archidekt(archidekt_id)
+        elif deck.startswith("https://moxfield.com/decks/"):
+            moxfield_id = deck.split("/")[-1]
+            print("Downloading moxfield deck, this may take a while...")
+            return download_moxfield(moxfield_id)
+        raise ValueError(f"Unsupported deck URL {deck}")
+
+    return parse_any(deck)
+
+def parse_decklist_text(text: str) -> Decklist:
+    """Like parse_any, for a decklist that isn't in a file."""
+    first_line = text.split("\n", 1)[0]
+    if first_line.count(",") >= 3:
+        return parse_csv_stream(io.StringIO(text))
+    return parse_decklist_stream(io.StringIO(text))
+
+def deck_images(decklist: Decklist, basic_lands: bool = False, ignore_counts: bool = False, custom_cards: bool = True):
+    """(images, counts, failed) for print_cards. Scryfall faces are still image URIs, see fetch_images.
+
+    custom_cards=False refuses cstm: lines, for decklists from someone who shouldn't get to read our files."""
+    images = []
+    counts = []
+    failed = [f"couldn't find {' '.join(identifier.values())} on scryfall" for identifier in decklist.missing]
+    for card in decklist.cards:
+        if isinstance(card, CustomCard) and not custom_cards:
+            failed.append(f"{card.name}: custom cards aren't allowed")
+            continue
+        if isinstance(card, CustomCard):
+            da_uris = []
+            failed_front = False
+            failed_back = False
+            if os.path.exists(card.front_face):
+                da_uris.append(card.front_face)
+            else:
+                failed_front = True
+            if card.back_face:
+                if os.path.exists(card.back_face):
+                    da_uris.append(card.back_face)
+                else:
+                    failed_back = True
+
+            if failed_front or failed_back:
+                err_fmt = ""
+                if failed_front and failed_back:
+                    err_fmt = "{name}: failed to locate front and back face"
+                elif failed_front:
+                    err_fmt = "{name}: failed to locate front face"
+                else:
+                    err_fmt = "{name}: failed to locate back face"
+
+                failed.append(err_fmt.format(name=card.name))
+
+                if failed_front:
+                    failed.append("    front should be at {front}".format(front=card.front_face))
+                if failed_back:
+                    failed.append("    back should be at {back}".format(back=card.back_face))
+
+
+            if len(da_uris) == 0:
+                continue
+        else:
+            if not basic_lands and "Basic Land" in card["type_line"]:
+                continue
+            da_uris = [uris["png"] for uris in card.image_uris]
+        images.append(da_uris)
+        counts.append(1 if ignore_counts else card.count)
+
+    return images, counts, failed
+
+def _is_uri(image):
+    return isinstance(image, str) and image.startswith(("https://", "http://"))
+
+def fetch_many_images(image_lists, errors: dict | None = None):
+    """Download every image URI in several deck_images lists at once and swap them for the cached files.
+
+    The first failed download raises, unless errors is given: then failures go in it (uri -> exception)
+    and those images are left as URIs."""
+    # currently assumes download will succeed which is usually true
+    # this doesn't (and can't) handle if we can't find a card because its mispelled or similar
+    unique_uris = list(dict.fromkeys(image for images in image_lists for card in images for image in card if _is_uri(image)))
+    with tracing.span("images.fetch", images=len(unique_uris)):
+        results = scryfall.iter_images(unique_uris, return_exceptions=errors is not None)
+        downloaded = {}
+        for uri, result in zip(unique_uris, tqdm(results, total=len(unique_uris), desc="Fetching card images")):
+            if isinstance(result, Exception):
+                errors[uri] = result
+            else:
+                downloaded[uri] = result
+    return [[[downloaded.get(image, image) for image in card] for card in images] for images in image_lists]
+
+def fetch_images(images):
+    return fetch_many_images([images])[0]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from proxygen.units import mm
+
+
+cross_size = 0.5 * mm
+
+@dataclass
+class Layout:
+    """Everything about where things go on a page, worked out once per job instead of once per card."""
+    # top left corner of every slot on a page, in slot order
+    slots: np.ndarray
+    # same slots mirrored left to right, for the back of a double sided page
+    mirrored_slots: np.ndarray
+    # guide line segments as rows of x1, y1, x2, y2
+    guide_crosses: np.ndarray
+    guide_edges: np.ndarray
+
+def _guide_points(start, step, n, move_by, guide_mode):
+    points = start + step * np.arange(n + 1)
+    if guide_mode == "edge" and move_by != 0:
+        # both edges of every gap, but only the inner edge of the outer ones
+        return np.sort(np.concatenate([points[:-1] + move_by, points[1:] - move_by]))
+    points[0] += move_by
+    points[-1] -= move_by
+    return points
+
+def make_layout(data) -> Layout:
+    cardsize = data["cardsize"]
+    bleed = data["bleed"]
+    papersize = data["papersize"]
+    N = data["N"]
+    offset = data["offset"]
+    card_spacing = data["card_spacing"]
+    guide_mode = data["guide_mode"]
+    container_size = data["container_size"]
+
+    if card_spacing > 0:
+        center_by = (container_size - cardsize) / 2
+    else:
+        center_by = 0
+
+    slot = np.arange(np.prod(N))
+    x = slot % N[0]
+    y = slot // N[0]
+    slots = offset + container_size * np.stack([x, y], axis=1) + center_by
+    mirrored_slots = offset + container_size * np.stack([N[0] - (x + 1), y], axis=1) + center_by
+
+    if bleed > 0:
+        move_by = bleed
+    else:
+        move_by = card_spacing / 2
+    col_points = _guide_points(offset[0], container_size[0], N[0], move_by, guide_mode)
+    row_points = _guide_points(offset[1], container_size[1], N[1], move_by, guide_mode)
+
+    rows, cols = (a.ravel() for a in np.meshgrid(row_points, col_points, indexing="ij"))
+    horizontal = np.stack([cols - cross_size, rows, cols + cross_size, rows], axis=1)
+    vertical = np.stack([cols, rows - cross_size, cols, rows + cross_size], axis=1)
+    guide_crosses = np.stack([horizontal, vertical], axis=1).reshape(-1, 4)
+
+    # offset to be flush with the edge of the cards
+    flush_offset = offset + card_spacing / 2
+    zeros_c = np.zeros_like(col_points)
+    zeros_r = np.zeros_like(row_points)
+    guide_edges = np.concatenate([
+        np.stack([col_points, zeros_c, col_points, zeros_c + flush_offset[1]], axis=1),
+        np.stack([col_points, zeros_c + papersize[1] - flush_offset[1], col_points, zeros_c + papersize[1]], axis=1),
+        np.stack([zeros_r, row_points, zeros_r + flush_offset[0], row_points], axis=1),
+        np.stack([zeros_r + papersize[0] - flush_offset[0], row_points, zeros_r + papersize[0], row_points], axis=1),
+    ])
+
+    return Layout(slots, mirrored_slots, guide_crosses, guide_edges)
@@ -0,0 +1,191 @@
+from fpdf import FPDF
+import numpy as np
+from PIL import Image
+import io
+import zlib
+import hashlib
+from proxygen.render_cache import render_cache
+from proxygen.units import line_width
+import tracing
+
+# only needed for pdf output, print_cards imports this when it gets there
+
+# pdf image filters we know how to produce
+image_compressions = {
+        "flate": "FlateDecode",
+        "jpeg": "DCTDecode",
+        }
+
+def _image_info(im, image_compression="flate", jpeg_quality=90):
+    """fpdf image info for a PIL image, so fpdf doesn't need to read it back from a file."""
+    if im.mode not in ("L", "LA", "RGB", "RGBA"):
+        im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+
+    alpha = None
+    if "A" in im.getbands():
+        if image_compression == "jpeg":
+            # no alpha in jpeg, the corners end up as paper anyway
+            background = Image.new(im.mode[:-1], im.size, 255)
+            background.paste(im, mask=im.getchannel("A"))
+            im = background
+        else:
+            alpha = im.getchannel("A")
+            im = im.convert(im.mode[:-1])
+
+    info = {
+            "w": im.width,
+            "h": im.height,
+            "cs": "DeviceGray" if im.mode == "L" else "DeviceRGB",
+            "bpc": 8,
+            "f": image_compressions[image_compression],
+            }
+    if image_compression == "jpeg":
+        buffer = io.BytesIO()
+        im.save(buffer, format="JPEG", quality=jpeg_quality)
+        info["data"] = buffer.getvalue()
+    else:
+        info["data"] = zlib.compress(im.tobytes())
+
+    if alpha is not None:
+        # fpdf writes soft masks with the png predictor, so every row needs a (none) filter byte in front
+        rows = np.asarray(alpha)
+        rows = np.hstack([np.zeros((rows.shape[0], 1), dtype=rows.dtype), rows])
+        info["smask"] = zlib.compress(rows.tobytes())
+
+    return info
+
+class _Buffer:
+    """Stands in for fpdf's output string. fpdf appends every line with buffer += line,
+    which copies the whole document so far each time and made writing big PDFs quadratic."""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def __iadd__(self, s):
+        self.parts.append(s)
+        self.length += len(s)
+        return self
+
+    def __len__(self):
+        # fpdf uses this for the xref offsets
+        return self.length
+
+    def __str__(self):
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0] if self.parts else ""
+
+    def encode(self, *args, **kwargs):
+        return str(self).encode(*args, **kwargs)
+
+class _FPDF(FPDF):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buffer = _Buffer()
+        # name -> form xobject, content that is drawn the same on many pages
+        self.forms = {}
+
+    def _lines_ops(self, segments):
+        # one path for all of them instead of a stroke per line
+        points = np.array(segments, dtype=float) * self.k
+        points[:, 1::2] = self.h * self.k - points[:, 1::2]
+        return "".join("%.2f %.2f m %.2f %.2f l " % tuple(p) for p in points) + "S"
+
+    def lines(self, segments):
+        self._out(self._lines_ops(segments))
+
+    def add_lines_form(self, name, groups, width):
+        """Record (segments, color) groups once, place them with use_form."""
+        ops = ["%.2f w" % (width * self.k)]
+        for segments, color in groups:
+            ops.append("%.3f %.3f %.3f RG" % tuple(c / 255 for c in color))
+            ops.append(self._lines_ops(segments))
+        self.forms[name] = {"i": len(self.forms) + 1, "data": "\n".join(ops)}
+
+    def use_form(self, name):
+        # q/Q so the form's colors don't leak into the page
+        self._out("q /X%d Do Q" % self.forms[name]["i"])
+
+    def _putimages(self):
+        super()._putimages()
+        for form in sorted(self.forms.values(), key=lambda form: form["i"]):
+            data = form["data"].encode("latin1")
+            compress = "/Filter /FlateDecode " if self.compress else ""
+            if self.compress:
+                data = zlib.compress(data)
+            self._newobj()
+            form["n"] = self.n
+            self._out("<</Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] %s/Length %d>>" % (self.w_pt, self.h_pt, compress, len(data)))
+            self._putstream(data)
+            self._out("endobj")
+
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        for form in sorted(self.forms.values(), key=lambda form: form["i"]):
+            self._out("/X%d %d 0 R" % (form["i"], form["n"]))
+
+    def inmem_image(self, name, im, x, y, w, h, image_compression="flate", jpeg_quality=90):
+        if name not in self.images:
+            with tracing.span("pdf.encode_image", compression=image_compression):
+                info = _image_info(im, image_compression, jpeg_quality)
+            tracing.count("pdf.images_embedded")
+            if "smask" in info and self.pdf_version < "1.4":
+                self.pdf_version = "1.4"
+            info["i"] = len(self.images) + 1
+            self.images[name] = info
+        # already registered, so fpdf just places it
+        self.image(name, x, y, w, h)
+
+class PDFDrawable:
+    def __init__(self, pagesize, output, image_compression="flate", jpeg_quality=90):
+        self.pdf = _FPDF('P', 'pt', format=pagesize)
+        self.pdf.set_line_width(line_width)
+        self.output = output
+        self.image_compression = image_compression
+        self.jpeg_quality = jpeg_quality
+
+    def _embed(self, name, im, x, y, w, h):
+        self.pdf.inmem_image(name, im, x, y, w, h, self.image_compression, self.jpeg_quality)
+
+    def line(self, x1, y1, x2, y2, color):
+        self.pdf.set_draw_color(r=color[0], g=color[1],b=color[2])
+        self.pdf.line(x1, y1, x2, y2)
+
+    def lines(self, segments, color):
+        self.pdf.set_draw_color(r=color[0], g=color[1],b=color[2])
+        self.pdf.lines(segments)
+
+    def overlay(self, name, groups):
+        # recorded once and referenced from every page
+        if name not in self.pdf.forms:
+            self.pdf.add_lines_form(name, groups, line_width)
+        self.pdf.use_form(name)
+    
+    def filled_rect(self, x, y, w, h, color):
+        self.pdf.set_fill_color(r=color[0],g=color[1],b=color[2])
+        self.pdf.rect(x, y, w, h, style='F')
+    
+    def image(self, path, x, y, w, h):
+        # named by contents, so every copy of a card shares one embedded image
+        name = "file:" + render_cache.digest(path)
+        if name in self.pdf.images:
+            self.pdf.image(name, x, y, w, h)
+        else:
+            with Image.open(path) as im:
+                tracing.count("images.decoded")
+                self._embed(name, im, x, y, w, h)
+
+    def inmem_image(self, im, x, y, w, h):
+        self._embed("mem:" + hashlib.sha1(im.tobytes()).hexdigest(), im, x, y, w, h)
+
+    def add_page(self):
+        tracing.count("pages.written")
+        self.pdf.add_page()
+
+
+    
+    def write_to_output(self):
+        print("Writing to {out}".format(out=self.output))
+        with tracing.span("pdf.output", output=str(self.output)):
+            self.pdf.output(self.output)
@@ -1,5 +1,3 @@
-import fpdf
-from fpdf import FPDF
 import numpy as np
 import itertools
 import collections
@@ -7,7 +5,12 @@ from pathlib import Path
 from tqdm import tqdm
 from PIL import Image, ImageDraw
 import os
-import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+from proxygen.render_cache import render_cache
+from proxygen.layout import make_layout
+from proxygen.units import page_sizes, dpi, inch, cm, mm, px, units, line_width
+import tracing
 
 # sus...
 
@@ -19,85 +22,61 @@ image_size = np.array([745, 1040])
 def _occupied_space(container_size, pos, closed: bool = False):
     return container_size * pos
 
-page_sizes = {
-        "a3": (841.89, 1190.55),
-        "a4": (595.28, 841.89),
-        "a5": (420.94, 595.28),
-        "letter": (612, 792),
-        "legal": (612, 1008)
-        }
-
-
-dpi = 300
-inch = 72
-cm = inch / 2.54
-mm = cm * 0.1
-# i did the thing i learned in science class, ts should NOT crash
-px = inch / dpi
-
-units = {
-        "pt": 1,
-        "in": inch,
-        "cm": cm,
-        "mm": mm
-        }
-
-line_width = 0.3 * mm
-
 def pt_to_px(i):
     return np.rint((i / inch) * dpi).astype(int)
 
-class PDFDrawable:
-    def __init__(self, pagesize, output):
-        self.pdf = FPDF('P', 'pt', format=pagesize)
-        self.pdf.set_line_width(line_width)
-        self.output = output
-
-    def line(self, x1, y1, x2, y2, color):
-        self.pdf.set_draw_color(r=color[0], g=color[1],b=color[2])
-        self.pdf.line(x1, y1, x2, y2)
-    
-    def filled_rect(self, x, y, w, h, color):
-        self.pdf.set_fill_color(r=color[0],g=color[1],b=color[2])
-        self.pdf.rect(x, y, w, h, style='F')
-    
-    def image(self, path, x, y, w, h):
-        self.pdf.image(path, x, y, w, h)
-
-    def inmem_image(self, im, x, y, w, h):
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as f:
-            tmp = f.name
-        
-        im.save(tmp)
-        # loaded into memory
-        # this is probably really bad if you have 10 mountains
-        self.pdf.image(tmp, x, y, w, h)
-        os.unlink(tmp)
-
-    def add_page(self):
-        self.pdf.add_page()
-
-
-    
-    def write_to_output(self):
-        print("Writing to {out}".format(out=self.output))
-        self.pdf.output(self.output)
+def _save_options(path, compress_level=6, quality=90):
+    extension = Path(path).suffix.lower()
+    if extension == ".png":
+        return {"compress_level": compress_level}
+    if extension in (".jpg", ".jpeg", ".webp"):
+        return {"quality": quality}
+    if extension in (".tif", ".tiff"):
+        return {"compression": "tiff_deflate"}
+    return {}
 
 class PILDrawable:
-    def __init__(self, pagesize, output):
+    def __init__(self, pagesize, output, compress_level=6, quality=90, writers=None, queue_depth=None):
         self.pagesize = pt_to_px(pagesize)
         self.img = None
         self.draw = None
         try: 
             str(output) % 1
         except TypeError:
-            print("Output file must have number format (try something like file%03d)")
-            exit(1)
+            # not exit(), this runs inside batch and server worker processes too
+            raise ValueError("Output file must have number format (try something like file%03d)")
         self.output = str(output)
         self.page = 0
+        self.overlays = {}
+        self.save_options = _save_options(self.output, compress_level, quality)
+
+        # pages get compressed in the background while the next one is drawn
+        # pillow lets go of the GIL while encoding so threads are enough
+        writers = writers or min(4, os.cpu_count() or 1)
+        self.writer = ThreadPoolExecutor(max_workers=writers)
+        # every queued page is ~25MB at 300 dpi, so don't let them pile up
+        self.queued = threading.BoundedSemaphore(queue_depth or writers + 1)
+        self.writes = []
     
     def line(self, x1, y1, x2, y2, color):
         self.draw.line([pt_to_px(x1), pt_to_px(y1), pt_to_px(x2), pt_to_px(y2)], fill=color, width=pt_to_px(line_width))
+
+    def lines(self, segments, color, draw=None):
+        draw = draw or self.draw
+        width = pt_to_px(line_width)
+        for segment in pt_to_px(np.asarray(segments)).tolist():
+            draw.line(segment, fill=color, width=width)
+
+    def overlay(self, name, groups):
+        # drawn once onto a transparent page, then composited in one go
+        if name not in self.overlays:
+            overlay = Image.new(mode="RGBA", size=(self.pagesize[0], self.pagesize[1]), color=(0, 0, 0, 0))
+            draw = ImageDraw.Draw(overlay)
+            for segments, color in groups:
+                self.lines(segments, color, draw)
+            self.overlays[name] = overlay
+        overlay = self.overlays[name]
+        self.img.paste(overlay, (0, 0), overlay)
     
     def filled_rect(self, x, y, w, h, color):
         self.draw.rectangle([pt_to_px(x), pt_to_px(y), pt_to_px(x + w), pt_to_px(y + h)], fill=color)
@@ -108,21 +87,37 @@ class PILDrawable:
     
     def image(self, path, x, y, w, h):
         if os.path.exists(path):
+            size = (pt_to_px(w), pt_to_px(h))
             with Image.open(path) as im:
-                self.inmem_image(im, x, y, w, h)
+                if im.size == size:
+                    self.img.paste(im, box=(pt_to_px(x), pt_to_px(y)))
+                    return
+            with Image.open(render_cache.get(path, size)) as im:
+                self.img.paste(im, box=(pt_to_px(x), pt_to_px(y)))
     def inmem_image(self, im, x, y, w, h):
         im_resized = im.resize((pt_to_px(w), pt_to_px(h)))
         self.img.paste(im_resized, box=(pt_to_px(x), pt_to_px(y)))
     
+    def _write(self, img, save_to):
+        try:
+            with tracing.span("page.save", output=str(save_to)):
+                img.save(save_to, **self.save_options)
+            img.close()
+        finally:
+            self.queued.release()
+
     def save(self):
         if self.img:
             save_to = self.output % self.page
-            self.img.save(save_to)
-            self.img.close()
+            self.queued.acquire()
+            self.writes.append(self.writer.submit(self._write, self.img, save_to))
+            self.img = None
+            self.draw = None
     def add_page(self):
         if self.img:
             print("saving page {}".format(self.page))
         self.save()
+        tracing.count("pages.written")
         self.img = Image.new(mode="RGB", size=(self.pagesize[0],self.pagesize[1]), color=(255,255,255))
         self.draw = ImageDraw.Draw(self.img)
         self.page = self.page + 1
@@ -131,99 +126,92 @@ class PILDrawable:
     def write_to_output(self):
         print("saving last page")
         self.save()
+        self.writer.shutdown(wait=True)
+        # raises if any of the pages failed to save
+        for write in self.writes:
+            write.result()
 
 
-def get_drawable(pagesize, filepath):
+def get_drawable(pagesize, filepath, image_compression="flate", jpeg_quality=90, compress_level=6):
     if str(filepath).endswith('pdf'):
-        return PDFDrawable(pagesize, filepath)
+        from proxygen.pdf import PDFDrawable
+        return PDFDrawable(pagesize, filepath, image_compression, jpeg_quality)
     else:
-        return PILDrawable(pagesize, filepath)
+        return PILDrawable(pagesize, filepath, compress_level, jpeg_quality)
 
 
 black = (0, 0, 0)
 gray = (128, 128, 128)
 
 def draw_guide(pdf, data):
-    cardsize = data["cardsize"]
-    bleed = data["bleed"]
-    papersize = data["papersize"]
-    N = data["N"]
-    offset = data["offset"]
-    card_spacing = data["card_spacing"]
-    guide_mode = data["guide_mode"]
-    container_size = data["container_size"]
-    
-
-    row_points = []
-    col_points = []
-
-    if bleed > 0:
-        move_by = bleed
-    else:
-        move_by = card_spacing / 2
-    for x in range(0, N[0] + 1):
-        x2 = offset[0] + _occupied_space(container_size, x)[0]
-        if guide_mode == "edge" and move_by != 0:
-            if x == 0 or x != N[0]:
-                col_points.append(x2 + move_by)
-            if x == N[0] or x != 0:
-                col_points.append(x2 - move_by)
-        else:
-            if x == 0:
-                col_points.append(x2 + move_by)
-            elif x == N[0]:
-                col_points.append(x2 - move_by)
-            else:
-                col_points.append(x2)
-    for y in range(0, N[1] + 1):
-        y2 = offset[1] + _occupied_space(container_size, y)[1]
-
-        if guide_mode == "edge" and move_by != 0:
-            if y == 0 or y != N[1]:
-                row_points.append(y2 + move_by)
-            if y == N[1] or y != 0:
-                row_points.append(y2 - move_by)
-        else:
-            if y == 0:
-                row_points.append(y2 + move_by)
-            elif y == N[1]:
-                row_points.append(y2 - move_by)
-            else:
-                row_points.append(y2)
-    cross_size = 0.5 * mm
-    # offset to be flush with the edge of the cards
-    flush_offset = offset + card_spacing / 2
-    for r in row_points:
-        for c in col_points:
-            pdf.line(c - cross_size, r, c + cross_size, r, color=gray)
-            pdf.line(c, r - cross_size, c, r + cross_size, color=gray)
-    for col in col_points:
-        pdf.line(x1=col, y1=0, x2=col, y2=flush_offset[1], color=black)
-        pdf.line(col, papersize[1] - flush_offset[1], col, papersize[1], color=black)
-    for row in row_points:
-        pdf.line(0, row, flush_offset[0], row, color=black)
-        pdf.line(papersize[0] - flush_offset[0], row, papersize[0], row, color=black)
+    layout = data["layout"]
+    pdf.overlay("guide", [(layout.guide_crosses, gray), (layout.guide_edges, black)])
         
 
+def _prepare_image(image, size, crop, trace=False):
+    if not trace:
+        return render_cache.get(image, size, crop), None
+    # workers don't see the parent's recorder, hand what happened back with the result
+    with tracing.Recorder() as recorder:
+        path = render_cache.get(image, size, crop)
+    return path, recorder.export()
+
+def prepare_images(images, size, crop=None, jobs=None):
+    """Yield (image, rendered path) for each unique image, in the order they're first used.
+    Images that don't exist (like failed downloads the user chose to print without) are left out."""
+    unique = list(dict.fromkeys(image for image in images if image and os.path.exists(image)))
+    if jobs == 1 or len(unique) < 2:
+        for image in unique:
+            yield image, render_cache.get(image, size, crop)
+        return
+
+    trace = tracing.enabled()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(_prepare_image, unique, itertools.repeat(size), itertools.repeat(crop), itertools.repeat(trace))
+        for image, (path, exported) in zip(unique, results):
+            if exported is not None:
+                tracing.replay(exported)
+            yield image, path
+
+@tracing.traced("draw_pdf")
 def draw_pdf(filepath, desc, images, draw_mode, data):
     cardsize = data["cardsize"]
     bleed = data["bleed"]
     papersize = data["papersize"]
     N = data["N"]
-    offset = data["offset"]
-    card_spacing = data["card_spacing"]
     guide = data["guide"]
     container_size = data["container_size"]
     card_zoom = data["card_zoom"]
+    jobs = data["jobs"]
+    layout = data["layout"]
     
     cards_per_sheet = np.prod(N)
 
-    pdf = get_drawable(papersize, filepath)
+    pdf = get_drawable(papersize, filepath, data["image_compression"], data["jpeg_quality"], data["compress_level"])
 
-    if card_spacing > 0:
-        center_by = (container_size - cardsize) / 2
+    # decoding and resampling happens up front in worker processes, the pdf itself is built here
+    if card_zoom > 0:
+        resize_to = pt_to_px(cardsize + card_zoom)
+        crop_to = pt_to_px(container_size)
+        crop_by = np.rint((resize_to - crop_to) / 2).astype(int)
+        pending = prepare_images(images, resize_to, (crop_by[0], crop_by[1], crop_by[0] + crop_to[0], crop_by[1] + crop_to[1]), jobs=jobs)
+    elif isinstance(pdf, PILDrawable):
+        pending = prepare_images(images, pt_to_px(cardsize), jobs=jobs)
     else:
-        center_by = 0
+        pending = iter(())
+    prepared = {}
+
+    def rendered(image):
+        if image not in prepared and not os.path.exists(image):
+            # the drawable skips it
+            return str(image)
+        while image not in prepared:
+            try:
+                key, path = next(pending)
+            except StopIteration:
+                return str(image)
+            prepared[key] = path
+        return prepared[image]
 
     for i, image in enumerate(tqdm(images, desc=desc)):
         if i % cards_per_sheet == 0:
@@ -233,25 +221,16 @@ def draw_pdf(filepath, desc, images, draw_mode, data):
             pdf.add_page()
 
         if image:
-            x = (i % cards_per_sheet) % N[0]
-            y = (i % cards_per_sheet) // N[0]
-   
             if draw_mode == "back" or (draw_mode == "double" and (i % (cards_per_sheet * 2)) >= cards_per_sheet):
-                x = N[0] - (x + 1)
-        
-            full_lower = offset + _occupied_space(container_size, np.array([x, y]))
-            lower = full_lower + center_by
+                lower = layout.mirrored_slots[i % cards_per_sheet]
+            else:
+                lower = layout.slots[i % cards_per_sheet]
             
             # pdf.filled_rect(x=lower[0], y=lower[1], w=cardsize[0], h=cardsize[1], color=black)
             if card_zoom > 0:
-                with Image.open(image) as im:
-                    im_resized = im.resize((pt_to_px(cardsize[0] + card_zoom), pt_to_px(cardsize[1] + card_zoom)))
-                    zoom_px = pt_to_px(card_zoom)
-                    crop_by = np.rint((np.array(im_resized.size) - pt_to_px(container_size)) / 2).astype(int)
-                    cropped = im_resized.crop((crop_by[0], crop_by[1], im_resized.width - crop_by[0], im_resized.height - crop_by[1]))
-                    pdf.inmem_image(cropped, lower[0], lower[1], container_size[0], container_size[1])
+                pdf.image(rendered(image), lower[0], lower[1], container_size[0], container_size[1])
             else:
-                pdf.image(str(image), x=lower[0], y=lower[1], w=cardsize[0], h=cardsize[1])
+                pdf.image(rendered(image), x=lower[0], y=lower[1], w=cardsize[0], h=cardsize[1])
                 # pdf.rect(full_lower[0], full_lower[1], container_size[0], container_size[1], black)
                 
     if guide:
@@ -260,6 +239,7 @@ def draw_pdf(filepath, desc, images, draw_mode, data):
     # tqdm.write(f"Writing to {filepath}")
     pdf.write_to_output()
 
+@tracing.traced("print_cards")
 def print_cards(
             images: list[list[str | Path]],
             filepath: str | Path,
@@ -270,8 +250,17 @@ def print_cards(
             bleed: float = 0,
             back_output: str | Path | None = None,
             show_guide: bool = False,
+            jobs: int | None = None,
+            image_compression: str = "flate", # flate, jpeg
+            jpeg_quality: int = 90,
+            compress_level: int = 6,
+            counts: list[int] | None = None,
             ) -> None:
 
+    if counts is not None:
+        # copies share the same paths, so each image is still only processed and embedded once
+        images = [card for card, count in zip(images, counts) for _ in range(count)]
+
     if bleed > 0:
         container_size = cardsize + bleed * 2 + 1 * px
         card_spacing = 0
@@ -307,7 +296,12 @@ def print_cards(
         "container_size": container_size,
         "card_zoom": card_zoom,
         "guide_mode": "edge", # center, edge
+        "jobs": jobs,
+        "image_compression": image_compression,
+        "jpeg_quality": jpeg_quality,
+        "compress_level": compress_level,
     }
+    shared_data["layout"] = make_layout(shared_data)
 
     if dfc_mode == "split_sides":
         dfcs = collections.deque()
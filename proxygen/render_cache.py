@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import gettempdir
+import threading
+import hashlib
+import os
+
+from PIL import Image
+
+import tracing
+
+
+def file_digest(path: str | Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
+
+def render(source: str | Path, size, crop=None, fmt: str = "png", dst: str | Path | None = None):
+    """Resize (and optionally crop) source. Saved to dst if given, otherwise the image is returned."""
+    with Image.open(source) as im:
+        out = im.resize((int(size[0]), int(size[1])))
+    if crop is not None:
+        out = out.crop(tuple(int(c) for c in crop))
+    if dst is None:
+        return out
+
+    if fmt == "jpeg" and out.mode != "RGB":
+        # no alpha in jpeg, the corners end up as paper anyway
+        background = Image.new("RGB", out.size, (255, 255, 255))
+        background.paste(out, mask=out.getchannel("A") if "A" in out.getbands() else None)
+        out = background
+    tmp = Path(dst).with_name(f"{Path(dst).name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    out.save(tmp, format=fmt)
+    os.replace(tmp, dst)
+    return dst
+
+class RenderCache:
+    """Resized card images keyed by (source contents, size, crop, format), least recently used get evicted past max_bytes."""
+
+    def __init__(self, directory: str | Path, max_bytes: int = 2 << 30):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._digests = {}
+        self._size = None
+        self._lock = threading.RLock()
+
+    def digest(self, source: str | Path) -> str:
+        stat = os.stat(source)
+        key = (str(source), stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            with tracing.span("render_cache.digest"):
+                digest = self._digests[key] = file_digest(source)
+        return digest
+
+    def path(self, source: str | Path, size, crop=None, fmt: str = "png") -> Path:
+        key = repr((self.digest(source), tuple(int(s) for s in size), None if crop is None else tuple(int(c) for c in crop), fmt))
+        return self.directory / (hashlib.sha1(key.encode()).hexdigest() + "." + fmt)
+
+    def get(self, source: str | Path, size, crop=None, fmt: str = "png") -> str:
+        dst = self.path(source, size, crop, fmt)
+        if dst.is_file():
+            # mtime doubles as the last access time
+            os.utime(dst)
+            tracing.count("render_cache.hits")
+            return str(dst)
+
+        tracing.count("render_cache.misses")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tracing.span("render_cache.render", source=str(source)):
+            render(source, size, crop, fmt, dst)
+        self._added(dst.stat().st_size)
+        return str(dst)
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            # leave some room so we don't scan the directory on every new entry
+            target = self.max_bytes * 0.9
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._size = total
+
+def default_directory() -> Path:
+    # same setting as scryfall's cache (scryfall.file_cache), not imported from there so stitch mode doesn't load requests
+    root = os.environ.get("PROXYGEN_CACHE_DIR")
+    return Path(root).expanduser() / "renders" if root else Path(gettempdir()) / "bublis_render_cache"
+
+render_cache = RenderCache(default_directory())
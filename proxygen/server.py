@@ -0,0 +1,215 @@
+"""Render decklists over HTTP, on a TCP port or a Unix socket.
+
+POST /render with a JSON body like
+
+    {"decklist": "4 Lightning Bolt (M10) 146\\n...", "page_size": "a4", "bleed": "0.1in", "guide": true}
+
+and the PDF comes back as the response body. Everything else is optional:
+page_size, card_size, card_spacing, bleed (same strings as the CLI), guide, dfc_mode (normal, paired or double_sided),
+basic_lands, ignore_counts, image_compression, jpeg_quality, and url (an archidekt/moxfield deck instead of decklist).
+If some cards can't be printed the response is a 422 with {"failed": [...]}, unless allow_incomplete is set.
+
+The card database, the HTTP session pool and the render cache stay loaded between requests,
+PDFs are rendered in a fixed pool of worker processes so a burst of requests queues up instead of piling on.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer
+import tempfile
+import json
+import os
+
+import requests
+
+from proxygen.decks import deck_images, deck_url_prefixes, fetch_images, load_decklist, parse_decklist_text
+from proxygen.pdf import image_compressions
+from proxygen.print_cards import print_cards
+from proxygen.units import layout_sizes
+
+
+dfc_modes = ("normal", "paired", "double_sided")
+# a decklist is a few KB, anything near this is a mistake or someone being rude
+max_request_bytes = 1 << 20
+
+class RequestError(Exception):
+    def __init__(self, status: int, body: dict):
+        super().__init__(body)
+        self.status = status
+        self.body = body
+
+def _render(images, counts, output, options):
+    # runs in a worker process, which keeps its own render cache digests warm
+    print_cards(images, output, counts=counts, jobs=1, **options)
+    return output
+
+class Renderer:
+    """The part of the server that doesn't care about HTTP."""
+
+    def __init__(self, workers: int | None = None):
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        # start the workers now, forking later from a process full of handler threads can copy held locks
+        self.executor.submit(os.getpid).result()
+
+    def render(self, request: dict, output: str | Path) -> list[str]:
+        """Render the request to output, returns the problems that were let through with allow_incomplete."""
+        if "decklist" in request:
+            decklist = parse_decklist_text(request["decklist"])
+        elif "url" in request:
+            url = request["url"]
+            # load_decklist reads anything else as a path on our disk
+            if not isinstance(url, str) or not url.startswith(deck_url_prefixes):
+                raise RequestError(400, {"error": "url must be an archidekt or moxfield deck"})
+            try:
+                decklist = load_decklist(url)
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                raise RequestError(502, {"error": "couldn't download the deck"})
+        else:
+            raise RequestError(400, {"error": "decklist or url is required"})
+
+        dfc_mode = request.get("dfc_mode", "normal")
+        if dfc_mode not in dfc_modes:
+            raise RequestError(400, {"error": f"dfc_mode must be one of {', '.join(dfc_modes)}"})
+        try:
+            page_size, card_size, card_spacing, bleed = layout_sizes(
+                request.get("page_size"),
+                request.get("card_size"),
+                request.get("card_spacing"),
+                request.get("bleed"),
+            )
+        except (ValueError, StopIteration) as e:
+            raise RequestError(400, {"error": f"invalid size: {e}"})
+        image_compression = request.get("image_compression", "flate")
+        if image_compression not in image_compressions:
+            raise RequestError(400, {"error": f"image_compression must be one of {', '.join(image_compressions)}"})
+        jpeg_quality = request.get("jpeg_quality", 90)
+        # bool is an int too
+        if not isinstance(jpeg_quality, int) or isinstance(jpeg_quality, bool) or not 1 <= jpeg_quality <= 95:
+            raise RequestError(400, {"error": "jpeg_quality must be a whole number from 1 to 95"})
+
+        # anyone who can reach us could otherwise point cstm: lines at our files
+        images, counts, failed = deck_images(decklist, request.get("basic_lands", False), request.get("ignore_counts", False), custom_cards=False)
+        if failed and not request.get("allow_incomplete", False):
+            raise RequestError(422, {"failed": failed})
+        if not images:
+            raise RequestError(422, {"failed": failed + ["nothing to print"]})
+        images = fetch_images(images)
+
+        options = {
+            "papersize": page_size,
+            "cardsize": card_size,
+            "card_spacing": card_spacing,
+            "bleed": bleed,
+            "dfc_mode": dfc_mode,
+            "show_guide": bool(request.get("guide", False)),
+            "image_compression": image_compression,
+            "jpeg_quality": jpeg_quality,
+        }
+        self.executor.submit(_render, images, counts, str(output), options).result()
+        return failed
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+class RenderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    chunk_size = 1 << 16
+
+    def address_string(self):
+        # unix socket clients don't have an address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._send_json(400, {"error": "invalid Content-Length"})
+            return
+        if length > max_request_bytes:
+            # the body is left unread, so this connection can't be reused
+            self.close_connection = True
+            self._send_json(413, {"error": f"request bodies are limited to {max_request_bytes} bytes"})
+            return
+        try:
+            request = json.loads(self.rfile.read(max(length, 0)))
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+            return
+
+        fd, output = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        try:
+            try:
+                failed = self.server.renderer.render(request, output)
+            except RequestError as e:
+                self._send_json(e.status, e.body)
+                return
+            except Exception as e:
+                self.log_error("render failed: %r", e)
+                # the details can say things about our files, they're in the log
+                self._send_json(500, {"error": "internal error"})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(os.path.getsize(output)))
+            if failed:
+                self.send_header("X-Proxygen-Failed", str(len(failed)))
+            self.end_headers()
+            with open(output, "rb") as f:
+                while chunk := f.read(self.chunk_size):
+                    self.wfile.write(chunk)
+        finally:
+            os.unlink(output)
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # a socket left behind by a server that didn't shut down cleanly
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+def make_server(renderer: Renderer, socket_path: str | Path | None = None, host: str = "127.0.0.1", port: int = 8000):
+    if socket_path is not None:
+        server = UnixHTTPServer(str(socket_path), RenderHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.renderer = renderer
+    return server
+
+def serve(socket_path: str | Path | None = None, host: str = "127.0.0.1", port: int = 8000, workers: int | None = None) -> None:
+    renderer = Renderer(workers)
+    server = make_server(renderer, socket_path, host, port)
+    print(f"Listening on {socket_path or f'http://{host}:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        renderer.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,94 @@
+# plain python (numpy only once sizes are actually parsed) so the CLI can start without pulling in numpy and friends
+
+page_sizes = {
+        "a3": (841.89, 1190.55),
+        "a4": (595.28, 841.89),
+        "a5": (420.94, 595.28),
+        "letter": (612, 792),
+        "legal": (612, 1008)
+        }
+
+
+dpi = 300
+inch = 72
+cm = inch / 2.54
+mm = cm * 0.1
+# i did the thing i learned in science class, ts should NOT crash
+px = inch / dpi
+
+units = {
+        "pt": 1,
+        "in": inch,
+        "cm": cm,
+        "mm": mm
+        }
+
+line_width = 0.3 * mm
+
+def parse_size(size):
+    import more_itertools
+    import numpy as np
+
+    x, remainder = more_itertools.before_and_after(lambda x : x != 'x', iter(size))
+    x = float(''.join(x))
+   
+    next(remainder)
+    y, remainder = more_itertools.before_and_after(lambda x : x.isnumeric() or x == '.', remainder)
+    y = float(''.join(y))
+
+    unit = ''.join(remainder)
+
+    if not unit:
+        unit = 'in'
+    
+    if unit not in units:
+        raise ValueError(f"Invalid unit {unit}")
+
+    unit_scale = units[unit]
+
+    return np.array([x, y]) * unit_scale
+
+def parse_length(size):
+    import more_itertools
+
+    x, unit = more_itertools.before_and_after(lambda x : x.isnumeric() or x == '.', iter(size))
+    x = float(''.join(x))
+
+    unit = ''.join(unit)
+
+    if not unit:
+        unit = 'in'
+
+    if unit not in units:
+        raise ValueError(f"Invalid unit {unit}")
+
+    return x * units[unit]
+
+def layout_sizes(page_size=None, card_size=None, card_spacing=None, bleed=None):
+    """(page size, card size, card spacing, bleed) in points from the CLI style strings, None means the default."""
+    import numpy as np
+
+    if page_size:
+        if page_size.lower() in page_sizes:
+            page_size = np.array(page_sizes[page_size.lower()])
+        else:
+            page_size = parse_size(page_size)
+    else:
+        page_size = np.array(page_sizes["letter"])
+
+    if card_size:
+        card_size = parse_size(card_size)
+    else:
+        card_size = np.array([2.5 * inch, 3.5 * inch])
+
+    if card_spacing:
+        card_spacing = parse_length(card_spacing)
+    else:
+        card_spacing = 0.1 * inch
+
+    if bleed:
+        bleed = parse_length(bleed)
+    else:
+        bleed = 0
+
+    return page_size, card_size, card_spacing, bleed
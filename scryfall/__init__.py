@@ -1,9 +1,14 @@
+from scryfall.client import Client, get_client, set_client
+from scryfall.rate_limit import RateLimiter
 from scryfall.scryfall import (
         canonic_card_name,
         get_card,
         get_cards,
         get_faces,
         get_image,
+        get_images,
+        resolve_cards,
+        iter_images,
         headers,
         card_by_id,
         cards_by_oracle_id
@@ -11,11 +16,18 @@ from scryfall.scryfall import (
 
 
 __all__ = [
+        "Client",
+        "get_client",
+        "set_client",
+        "RateLimiter",
         "canonic_card_name",
         "get_card",
         "get_cards",
         "get_faces",
         "get_image",
+        "get_images",
+        "resolve_cards",
+        "iter_images",
         "headers",
         "card_by_id",
         "cards_by_oracle_id"
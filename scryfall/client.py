@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+headers = {"user-agent": "TheDrawingCoder-Gamer/cardstopdf/0.0.2", "accept": "*/*" }
+
+class Client:
+    """One pooled keep-alive session for every request we make, so we don't pay a handshake per image."""
+
+    def __init__(
+            self,
+            pool_size: int = 16,
+            retries: int = 5,
+            backoff_factor: float = 0.5,
+            timeout: float | tuple[float, float] = (10, 60),
+            ):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD", "POST"),
+            respect_retry_after_header=True,
+            # callers look at the status code themselves
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> Client:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client()
+        return _client
+
+def set_client(client: Client) -> None:
+    global _client
+    with _client_lock:
+        old, _client = _client, client
+    if old is not None and old is not client:
+        old.close()
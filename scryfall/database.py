@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+import threading
+import sqlite3
+import json
+import time
+import os
+import re
+
+
+# everything else in the bulk data is dead weight for us
+card_fields = ("id", "oracle_id", "name", "set", "collector_number", "type_line", "layout", "image_uris", "card_faces")
+face_fields = ("name", "oracle_id", "type_line", "image_uris")
+
+# query keys that map to an indexed column, the rest are filtered in python
+columns = {
+    "id": "id",
+    "oracle_id": "oracle_id",
+    "name": "name",
+    "set": "set_code",
+    "collector_number": "collector_number",
+}
+
+_schema = """
+CREATE TABLE cards (
+    id TEXT NOT NULL,
+    oracle_id TEXT,
+    name TEXT NOT NULL,
+    set_code TEXT NOT NULL,
+    collector_number TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+_indices = """
+CREATE UNIQUE INDEX cards_id ON cards (id);
+CREATE INDEX cards_oracle_id ON cards (oracle_id);
+CREATE INDEX cards_name ON cards (name);
+CREATE INDEX cards_print ON cards (set_code, collector_number);
+"""
+
+_collection_schema = """
+CREATE TABLE IF NOT EXISTS collection (
+    key TEXT PRIMARY KEY,
+    card TEXT NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS collection_used ON collection (used);
+"""
+
+_whitespace = re.compile(r"\s*")
+
+def iter_json_array(stream, chunk_size: int = 1 << 20, max_element_size: int = 16 << 20):
+    """Yield the elements of a top level JSON array one at a time, without reading the whole thing in.
+
+    Raises ValueError for anything that isn't one, and when max_element_size characters go by without an element
+    decoding, so garbage in the middle of a file fails there instead of being read into memory until the end."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    # between elements we want a comma or the end, otherwise an element
+    want_element = True
+    empty = True
+    eof = False
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+        pos = _whitespace.match(buffer).end()
+        if not started:
+            if pos == len(buffer):
+                continue
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos = _whitespace.match(buffer, pos + 1).end()
+
+        while pos < len(buffer):
+            if not want_element:
+                if buffer[pos] == "]":
+                    return
+                if buffer[pos] != ",":
+                    raise ValueError(f"Expected ',' or ']' between array elements, got {buffer[pos]!r}")
+                want_element = True
+                pos = _whitespace.match(buffer, pos + 1).end()
+                continue
+
+            if buffer[pos] == "]":
+                if empty:
+                    return
+                raise ValueError("Trailing comma in JSON array")
+            if buffer[pos] == ",":
+                raise ValueError("Missing JSON array element before ','")
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break
+            # something cut off at the end of the chunk might still parse (like a number), wait for more
+            if end == len(buffer) and not eof:
+                break
+            yield item
+            want_element = empty = False
+            pos = _whitespace.match(buffer, end).end()
+
+        buffer = buffer[pos:]
+        if len(buffer) > max_element_size:
+            raise ValueError(f"No JSON array element in {len(buffer)} characters")
+
+    raise ValueError("Unterminated JSON array")
+
+def canonic_card_name(name):
+    name = name.lower()
+
+    # didn't copy paste æ btw
+    name = name.replace("æ", "ae")
+
+    return name
+
+def project(card):
+    projected = {key: card[key] for key in card_fields if key in card}
+    if "card_faces" in projected:
+        projected["card_faces"] = [{key: face[key] for key in face_fields if key in face} for face in card["card_faces"]]
+    return projected
+
+def card_oracle_id(card):
+    if "oracle_id" in card:
+        return card["oracle_id"]
+    elif "card_faces" in card and "oracle_id" in card["card_faces"][0]:
+        return card["card_faces"][0]["oracle_id"]
+    return None
+
+def _row(card):
+    card = project(card)
+    return (
+        card["id"],
+        card_oracle_id(card),
+        canonic_card_name(card["name"]),
+        card["set"].lower(),
+        card["collector_number"].lower(),
+        json.dumps(card, separators=(",", ":")),
+    )
+
+class CardDatabase:
+    """Cards stored in SQLite, only the rows that get looked up are ever decoded."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    @classmethod
+    def build(cls, path: str | Path, cards: Iterable[dict], batch_size: int = 2048) -> CardDatabase:
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.executescript(_schema)
+            batch = []
+            for card in cards:
+                batch.append(_row(card))
+                if len(batch) >= batch_size:
+                    connection.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?)", batch)
+                    batch.clear()
+            connection.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?)", batch)
+            # indices are cheaper to build in one go at the end
+            connection.executescript(_indices)
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    def _select(self, where: str = "", params: tuple = ()) -> list[dict]:
+        rows = self.connection.execute(f"SELECT data FROM cards {where} ORDER BY rowid", params)
+        return [json.loads(data) for (data,) in rows]
+
+    def find(self, **query) -> list[dict]:
+        """Cards whose indexed columns equal the (already normalized) values in query."""
+        if not query:
+            return self._select()
+        where = " AND ".join(f"{columns[key]} = ?" for key in query)
+        return self._select(f"WHERE {where}", tuple(query.values()))
+
+    def get(self, card_id: str) -> dict | None:
+        row = self.connection.execute("SELECT data FROM cards WHERE id = ?", (card_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def keys(self, column: str) -> list[str]:
+        rows = self.connection.execute(f"SELECT DISTINCT {columns[column]} FROM cards WHERE {columns[column]} IS NOT NULL")
+        return [key for (key,) in rows]
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+class CollectionCache:
+    """Cards looked up one at a time (through /cards/collection), by identifier key.
+
+    Shared by every process using the cache directory, sqlite does the locking. Holds at most max_entries,
+    the ones used least recently go first."""
+
+    def __init__(self, path: str | Path, max_entries: int = 50000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(_collection_schema)
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, keys: Iterable[tuple]) -> dict[tuple, dict]:
+        found = {}
+        for key in set(keys):
+            row = self.connection.execute("SELECT card FROM collection WHERE key = ?", (json.dumps(key),)).fetchone()
+            if row is not None:
+                found[key] = json.loads(row[0])
+        if found:
+            now = time.time()
+            with self.connection:
+                self.connection.executemany("UPDATE collection SET used = ? WHERE key = ?", [(now, json.dumps(key)) for key in found])
+        return found
+
+    def put_many(self, cards: Mapping[tuple, dict]) -> None:
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO collection VALUES (?, ?, ?)",
+                [(json.dumps(key), json.dumps(card), now) for key, card in cards.items()],
+            )
+            self.connection.execute(
+                "DELETE FROM collection WHERE key IN (SELECT key FROM collection ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM collection").fetchone()[0]
+
+class CardsBy(Mapping):
+    """Read only mapping over one of the indexed columns."""
+
+    def __init__(self, database: CardDatabase, column: str, many: bool = False):
+        self.database = database
+        self.column = column
+        self.many = many
+
+    def __getitem__(self, key):
+        cards = self.database.find(**{self.column: key})
+        if not cards:
+            raise KeyError(key)
+        return cards if self.many else cards[0]
+
+    def __iter__(self):
+        return iter(self.database.keys(self.column))
+
+    def __len__(self):
+        return len(self.database.keys(self.column))
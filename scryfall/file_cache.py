@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import gettempdir
+import threading
+import hashlib
+import sqlite3
+import atexit
+import time
+import os
+import re
+
+from scryfall.locks import file_lock
+import tracing
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+_units = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+def parse_bytes(value: str | int) -> int:
+    """4G, 500M, 1024..."""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*", value.lower())
+    if match is None:
+        raise ValueError(f"Invalid size {value}")
+    return int(float(match.group(1)) * _units[match.group(2)])
+
+def cache_root() -> Path | None:
+    """PROXYGEN_CACHE_DIR, where every cache goes when it's set. main.py sets it for --cache-dir."""
+    root = os.environ.get("PROXYGEN_CACHE_DIR")
+    return Path(root).expanduser() if root else None
+
+class FileCache:
+    """Files spread over 256 subdirectories by a hash of their name, so no directory gets huge.
+
+    Entries added with added() are tracked in a small sqlite index with when they were last used, and the least
+    recently used ones are deleted once there are more than max_entries or they take more than max_bytes.
+    Other files (like the card database) can live here through path() too, they're just never evicted."""
+
+    def __init__(self, directory: str | Path, max_bytes: int | None = None, max_entries: int | None = None, min_age: float = 10 * 60):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        # anything used more recently than this is kept even over the limits, someone is probably about to open it
+        self.min_age = min_age
+        self._connection = None
+        self._lock = threading.RLock()
+        # access times are written in batches, a write per cache hit would be most of the cost of a hit
+        self._touched = {}
+        self._made = set()
+
+    def path(self, name: str) -> Path:
+        shard = hashlib.sha1(name.encode()).hexdigest()[:2]
+        if shard not in self._made:
+            # not at construction, so just importing us doesn't touch the disk
+            (self.directory / shard).mkdir(parents=True, exist_ok=True)
+            self._made.add(shard)
+        return self.directory / shard / name
+
+    def legacy_path(self, name: str) -> Path:
+        # where everything went before the cache was sharded
+        return self.directory / name
+
+    def adopt(self, name: str) -> bool:
+        """Move a file left in the top level directory by an older version into its shard, True if there was one."""
+        try:
+            os.replace(self.legacy_path(name), self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def lock(self, name: str, delete: bool = False):
+        return file_lock(self.path(name), delete=delete)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # every process using the cache shares the index, sqlite does the locking
+            connection = sqlite3.connect(self.directory / "index.sqlite", timeout=60, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(_schema)
+            self._connection = connection
+            atexit.register(self.flush)
+        return self._connection
+
+    def touch(self, name: str) -> None:
+        with self._lock:
+            self._touched[name] = time.time()
+            if len(self._touched) >= 256:
+                self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._touched:
+                return
+            touched, self._touched = self._touched, {}
+            with self.connection:
+                for name, accessed in touched.items():
+                    updated = self.connection.execute("UPDATE entries SET accessed = ? WHERE name = ?", (accessed, name)).rowcount
+                    if not updated:
+                        # on disk from before there was an index
+                        self._insert(name, accessed)
+
+    def _insert(self, name, accessed):
+        try:
+            size = self.path(name).stat().st_size
+        except FileNotFoundError:
+            return
+        self.connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (name, size, accessed))
+
+    def added(self, name: str) -> None:
+        """Track a file just written to path(name), evicting others if that puts us over a limit.
+        Don't call this while holding a lock on an entry, evicting takes them too."""
+        with self._lock:
+            self._touched.pop(name, None)
+            with self.connection:
+                self._insert(name, time.time())
+        if self.max_bytes is not None or self.max_entries is not None:
+            self.evict()
+
+    def forget(self, name: str) -> None:
+        """Delete an entry."""
+        with self.lock(name, delete=True):
+            self.path(name).unlink(missing_ok=True)
+        with self._lock:
+            self._touched.pop(name, None)
+            with self.connection:
+                self.connection.execute("DELETE FROM entries WHERE name = ?", (name,))
+
+    def usage(self) -> tuple[int, int]:
+        """(entries, bytes) tracked in the index."""
+        with self._lock:
+            self.flush()
+            return self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def evict(self) -> None:
+        with self._lock:
+            entries, size = self.usage()
+            over_entries = entries - self.max_entries if self.max_entries is not None else 0
+            over_bytes = size - self.max_bytes if self.max_bytes is not None else 0
+            if over_entries <= 0 and over_bytes <= 0:
+                return
+
+            rows = self.connection.execute(
+                "SELECT name, size FROM entries WHERE accessed < ? ORDER BY accessed",
+                (time.time() - self.min_age,),
+            )
+            victims = []
+            for name, entry_size in rows:
+                if over_entries <= 0 and over_bytes <= 0:
+                    break
+                victims.append(name)
+                over_entries -= 1
+                over_bytes -= entry_size
+            rows.close()
+
+        # not under _lock, forget waits for the entry's file lock and whoever holds that may be waiting on _lock
+        for name in victims:
+            self.forget(name)
+        tracing.count("scryfall.file_cache.evicted", len(victims))
+
+def default_directory() -> Path:
+    root = cache_root()
+    return root / "scryfall" if root is not None else Path(gettempdir()) / "bublis_scryfall_cache"
+
+def from_environment() -> FileCache:
+    """The cache as configured by PROXYGEN_CACHE_DIR, PROXYGEN_CACHE_MAX_SIZE and PROXYGEN_CACHE_MAX_ENTRIES."""
+    max_size = os.environ.get("PROXYGEN_CACHE_MAX_SIZE", "8G")
+    max_entries = int(os.environ.get("PROXYGEN_CACHE_MAX_ENTRIES", "50000"))
+    if max_entries < 0:
+        raise ValueError(f"PROXYGEN_CACHE_MAX_ENTRIES can't be negative, got {max_entries}")
+    return FileCache(
+        default_directory(),
+        # 0 turns a limit off
+        max_bytes=parse_bytes(max_size) or None,
+        max_entries=max_entries or None,
+    )
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+import tracing
+
+
+# lock files live next to what they protect, in their own directory so they don't look like cache entries
+lock_directory_name = ".locks"
+
+# path -> [lock, threads holding or waiting for it], dropped when nobody is so a long running server doesn't keep one per image
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+@contextmanager
+def _thread_lock(path):
+    with _thread_locks_lock:
+        entry = _thread_locks.get(path)
+        if entry is None:
+            entry = _thread_locks[path] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _thread_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _thread_locks[path]
+
+def lock_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.parent / lock_directory_name / (path.name + ".lock")
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    # LK_LOCK only retries for 10 seconds before giving up, building the database takes longer than that
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _open_locked(lock_file):
+    while True:
+        f = open(lock_file, "a+b")
+        try:
+            _lock(f)
+            # whoever had it may have deleted the lock file on the way out, then we'd be holding a lock nobody else can see
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(lock_file)):
+                return f
+        except FileNotFoundError:
+            pass
+        except BaseException:
+            f.close()
+            raise
+        f.close()
+
+@contextmanager
+def file_lock(path: str | Path, delete: bool = False):
+    """Hold an exclusive lock on path, against other threads and other processes sharing the cache.
+
+    Check whether the work is still needed after getting the lock: whoever had it before may have just done it.
+    The lock is released when the process dies, so a crashed worker can't wedge everyone else.
+    delete removes the lock file afterwards, for when path itself is being deleted."""
+    path = Path(path)
+    # flock excludes other open files in this process too, this just keeps threads from each holding a descriptor open while they wait
+    with _thread_lock(path):
+        lock_file = lock_path(path)
+        lock_file.parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        f = _open_locked(lock_file)
+        waited = time.perf_counter() - start
+        if waited > 0.001:
+            tracing.count("cache.lock_wait_seconds", waited)
+        try:
+            yield
+        finally:
+            # windows can't delete a file that's still open, those just stay around
+            if delete and fcntl is not None:
+                lock_file.unlink(missing_ok=True)
+            _unlock(f)
+            f.close()
+
+def write_atomic(path: str | Path, mode: str = "w", **kwargs):
+    """open() for a file that other processes should only ever see whole: writes to a temp file, renamed over path on close."""
+    return _AtomicFile(Path(path), mode, kwargs)
+
+class _AtomicFile:
+    def __init__(self, path, mode, kwargs):
+        self.path = path
+        self.tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self.file = open(self.tmp_path, mode, **kwargs)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
@@ -1,18 +1,100 @@
+from __future__ import annotations
+
+from email.utils import parsedate_to_datetime
 import threading
+import asyncio
 import time
 
+import tracing
+
+
 class RateLimiter:
-    def __init__(self, delay):
-        self.delay = delay
+    """Token bucket, rate requests per second on average with up to burst at once.
+
+    Works as `with limiter:` and `async with limiter:`. Nobody sleeps while holding the lock,
+    each caller reserves a slot and then waits for it on its own, so waiting threads don't queue behind each other's sleeps.
+    """
+
+    def __init__(self, rate: float | None = None, burst: int = 1, delay: float | None = None):
+        if rate is None:
+            if delay is None:
+                raise ValueError("Either rate or delay is required")
+            rate = 1 / delay
+        self.rate = rate
+        self.burst = burst
         self.lock = threading.Lock()
-        self.last_call = 0
+        self.tokens = float(burst)
+        # when tokens were last counted, in the future while paused by a Retry-After
+        self.last = time.monotonic()
 
-    def __enter__(self):
+    def reserve(self) -> float:
+        """Take a token, returns how long to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            if now > self.last:
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+            # going negative is a reservation on a token that hasn't been refilled yet
+            self.tokens -= 1
+            wait = self.last - now
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            tracing.count("rate_limiter.wait_seconds", wait)
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            tracing.count("rate_limiter.wait_seconds", wait)
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold everything for seconds, on top of the normal rate."""
         with self.lock:
-            if time.time() < self.last_call + self.delay:
-                time.sleep(self.last_call + self.delay - time.time())
-            self.last_call = time.time()
+            # nothing refills until the pause is over, so there's no burst right after it either,
+            # just the one request the server said it would take
+            self.tokens = min(self.tokens, 1.0)
+            self.last = max(self.last, time.monotonic() + seconds)
+
+    def observe(self, response) -> None:
+        """Honor Retry-After on a 429 (or 503) response."""
+        if response.status_code not in (429, 503):
+            return
+        seconds = retry_after(response.headers.get("Retry-After"))
+        if seconds is None and response.status_code == 429:
+            # told to slow down without a time, back off by one full bucket
+            seconds = self.burst / self.rate
+        if seconds:
+            self.pause(seconds)
+
+    def __enter__(self):
+        self.acquire()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+def retry_after(value: str | None) -> float | None:
+    """Seconds from a Retry-After header, which is either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
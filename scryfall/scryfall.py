@@ -2,23 +2,37 @@ from __future__ import annotations
 
 from scryfall.rate_limit import RateLimiter
 from pathlib import Path
-from tempfile import gettempdir
+from scryfall.database import CardDatabase, CardsBy, CollectionCache, canonic_card_name, columns, iter_json_array, project
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import threading
-import pickle
 import json
 from functools import cache as memoize
-from collections import defaultdict
+import time
 import os
 
 import requests
 
+from scryfall.client import get_client, headers
+from scryfall.transfer import download, looks_complete
+from scryfall.locks import file_lock, write_atomic
+from scryfall.file_cache import from_environment
+import tracing
 
 
-headers = {"user-agent": "TheDrawingCoder-Gamer/cardstopdf/0.0.2", "accept": "*/*" }
-cache = Path(gettempdir()) / "bublis_scryfall_cache"
-cache.mkdir(parents=True, exist_ok=True)
-scryfall_rate_limiter = RateLimiter(delay=0.1)
-_download_lock = threading.Lock()
+# images and bulk data, see file_cache.from_environment for where and how big.
+# made on first use, so the environment can still be changed after importing us (main.py does for --cache-dir)
+file_cache = None
+
+def _file_cache():
+    global file_cache
+    if file_cache is None:
+        file_cache = from_environment()
+    return file_cache
+# scryfall asks for no more than 10 requests a second on average
+scryfall_rate_limiter = RateLimiter(rate=10, burst=5)
+# scryfall only regenerates bulk files every 12 hours, don't ask more often than that
+bulk_max_age = float(os.environ.get("SCRYFALL_BULK_MAX_AGE", 12 * 60 * 60))
 
 def get_image(image_uri):
     split = image_uri.split("/")
@@ -26,31 +40,65 @@ def get_image(image_uri):
     return get_file(file_name, image_uri)
 
 def get_result_path(file_name):
-    return cache / file_name
+    cache = _file_cache()
+    path = cache.path(file_name)
+    if not path.exists():
+        # older versions kept everything in the top level directory
+        cache.adopt(file_name)
+    return path
+
+def _is_api_url(url):
+    return urlparse(url).hostname == "api.scryfall.com"
+
+def _api_request(method, url, **kwargs):
+    with scryfall_rate_limiter, tracing.span("scryfall.request", method=method, url=url):
+        response = get_client().request(method, url, **kwargs)
+    tracing.count("scryfall.requests")
+    # urllib3 already waited out Retry-After for its own retries, this slows everyone else down too
+    scryfall_rate_limiter.observe(response)
+    return response
 
 def get_file(file_name, url):
-    file_path = cache / file_name
-    with _download_lock:
-        if not file_path.is_file():
-            if "api.scryfall.com" in url:
-                with scryfall_rate_limiter:
-                    download(url, file_path)
-            else:
-                download(url, file_path)
+    cache = _file_cache()
+    file_path = get_result_path(file_name)
+    # only downloads of the same file wait on each other, in this process or any other using the cache
+    with cache.lock(file_name):
+        if file_path.is_file() and not looks_complete(file_path):
+            # cut short before downloads were atomic, fetch it again instead of failing on it forever
+            tracing.count("scryfall.file_cache.corrupt")
+            file_path.unlink()
+        hit = file_path.is_file()
+        if not hit:
+            tracing.count("scryfall.file_cache.misses")
+            download(url, file_path, rate_limiter=scryfall_rate_limiter if _is_api_url(url) else None)
+        else:
+            tracing.count("scryfall.file_cache.hits")
 
+    # outside the lock, adding can evict other entries which means taking their locks
+    if hit:
+        cache.touch(file_name)
+    else:
+        cache.added(file_name)
     return str(file_path)
 
-def download(url, dst, chunk_size = 1024 * 4):
-    with requests.get(url, stream=True, headers=headers) as req:
-        req.raise_for_status()
-        with open(dst, "xb") as f:
-            for chunk in req.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    f.write(chunk)
+def _get_image_or_error(image_uri):
+    try:
+        return get_image(image_uri)
+    except Exception as e:
+        return e
+
+def iter_images(image_uris, max_workers=8, return_exceptions=False):
+    """Image paths in the same order as image_uris. With return_exceptions a failed download
+    comes back as its exception instead of stopping the rest."""
+    # images come from cards.scryfall.io which isn't rate limited, so fetch them in parallel
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(_get_image_or_error if return_exceptions else get_image, image_uris)
+
+def get_images(image_uris, max_workers=8):
+    return list(iter_images(image_uris, max_workers=max_workers))
 
 def depaginate(url):
-    with scryfall_rate_limiter:
-        response = requests.get(url, headers=headers).json()
+    response = _api_request("GET", url).json()
     assert response["object"]
     if "data" not in response:
         return []
@@ -60,38 +108,115 @@ def depaginate(url):
 
     return data
 
-@memoize
-def _get_database(database_name="default_cards"):
-    databases = depaginate("https://api.scryfall.com/bulk-data")
-    bulk_data = [database for database in databases if database["type"] == database_name]
+def _metadata_path(database_name):
+    return get_result_path(f"{database_name}.meta.json")
+
+def _load_metadata(database_name):
+    try:
+        with open(_metadata_path(database_name), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_metadata(database_name, metadata):
+    with write_atomic(_metadata_path(database_name), encoding="utf-8") as f:
+        json.dump(metadata, f)
+
+def _fetch_metadata(database_name, previous):
+    request_headers = {}
+    if previous and previous.get("etag"):
+        request_headers["if-none-match"] = previous["etag"]
+
+    response = _api_request("GET", "https://api.scryfall.com/bulk-data", headers=request_headers)
+
+    if response.status_code == 304:
+        return dict(previous, checked_at=time.time())
+    response.raise_for_status()
+
+    bulk_data = [database for database in response.json()["data"] if database["type"] == database_name]
     if len(bulk_data) != 1:
         raise ValueError(f"Unknown database {database_name}")
 
-    file_name = bulk_data[0]["download_uri"].split("/")[-1]
-    bulk_path = get_result_path(file_name)
-    pickle_path = bulk_path.with_suffix(".pickle")
-    if pickle_path.is_file():
-        with open(pickle_path, "rb") as f:
-            return pickle.load(f)
-    else:
-        print("Database is missing or out of date, fetching (this may take a while...)")
-        bulk_file = Path(get_file(file_name, bulk_data[0]["download_uri"]))
-        with open(bulk_file, encoding="utf-8") as json_file:
-            data = json.load(json_file)
-        with open(pickle_file, "wb") as pickle_file:
-            pickle.dump(data, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
-        return data
-def canonic_card_name(name):
-    name = name.lower()
+    return {
+        "type": database_name,
+        "updated_at": bulk_data[0]["updated_at"],
+        "download_uri": bulk_data[0]["download_uri"],
+        "file_name": bulk_data[0]["download_uri"].split("/")[-1],
+        "etag": response.headers.get("etag"),
+        "checked_at": time.time(),
+    }
 
-    # didn't copy paste æ btw
-    name = name.replace("æ", "ae")
+def _collect_garbage(metadata):
+    # bulk files are named like default-cards-20240101100544.json, anything else with that prefix is stale
+    current = Path(metadata["file_name"]).stem
+    prefix = current.rsplit("-", 1)[0] + "-"
+    cache = _file_cache()
+    # the top level is where older versions put them
+    for path in [*cache.directory.glob(prefix + "*"), *cache.directory.glob("*/" + prefix + "*")]:
+        if path.name.split(".")[0] != current:
+            if path.parent == cache.directory:
+                path.unlink(missing_ok=True)
+            else:
+                cache.forget(path.name)
 
-    return name
+def _is_fresh(metadata):
+    return metadata is not None and time.time() - metadata["checked_at"] < bulk_max_age
 
-def get_cards(database="default_cards", **kwargs):
-    cards = _get_database(database)
+@memoize
+def _get_bulk_data(database_name="default_cards"):
+    metadata = _load_metadata(database_name)
+    if _is_fresh(metadata):
+        return metadata
+
+    with file_lock(_metadata_path(database_name)):
+        # another worker may have checked while we waited
+        metadata = _load_metadata(database_name)
+        if _is_fresh(metadata):
+            return metadata
+        return _refresh_bulk_data(database_name, metadata)
+
+def _refresh_bulk_data(database_name, metadata):
+    try:
+        fresh = _fetch_metadata(database_name, metadata)
+    except requests.RequestException:
+        if metadata is None:
+            raise
+        print("Couldn't reach scryfall, using the cached database")
+        return metadata
+
+    if metadata is not None and fresh["updated_at"] == metadata["updated_at"]:
+        fresh["file_name"] = metadata["file_name"]
+    _save_metadata(database_name, fresh)
+    _collect_garbage(fresh)
+
+    return fresh
+
+def _bulk_path(database_name="default_cards"):
+    return get_result_path(_get_bulk_data(database_name)["file_name"])
+
+def _database_path(bulk_file_name):
+    return get_result_path(Path(bulk_file_name).with_suffix(".sqlite").name)
+
+@memoize
+@tracing.traced("scryfall.load_database")
+def _get_database(database_name="default_cards"):
+    bulk_data = _get_bulk_data(database_name)
+    bulk_path = _bulk_path(database_name)
+    database_path = _database_path(bulk_path.name)
+    if database_path.is_file():
+        return CardDatabase(database_path)
+
+    # one worker builds it, the rest wait and use theirs
+    with file_lock(database_path):
+        if database_path.is_file():
+            return CardDatabase(database_path)
+        print("Database is missing or out of date, fetching (this may take a while...)")
+        bulk_file = Path(get_file(bulk_path.name, bulk_data["download_uri"]))
+        with open(bulk_file, encoding="utf-8") as json_file, tracing.span("scryfall.build_database"):
+            return CardDatabase.build(database_path, iter_json_array(json_file))
 
+def get_cards(database="default_cards", **kwargs):
+    query = {}
     for key, value in kwargs.items():
         if value is not None:
             value = value.lower()
@@ -99,6 +224,14 @@ def get_cards(database="default_cards", **kwargs):
             if key == "name":
                 value = canonic_card_name(value)
 
+            query[key] = value
+
+    indexed = {key: value for key, value in query.items() if key in columns}
+    tracing.count("scryfall.lookups")
+    cards = _get_database(database).find(**indexed)
+
+    for key, value in query.items():
+        if key not in indexed:
             cards = [card for card in cards if key in card and card[key].lower() == value]
 
     return cards
@@ -108,6 +241,99 @@ def get_card(card_name: str, set_id: str = None, collector_number = None):
     
     return cards[0] if len(cards) > 0 else None
 
+def _identifier_key(identifier):
+    if "id" in identifier:
+        return ("id", identifier["id"].lower())
+    if "set" in identifier and "collector_number" in identifier:
+        return ("print", identifier["set"].lower(), identifier["collector_number"].lower())
+    if "name" in identifier:
+        return ("name", canonic_card_name(identifier["name"]), identifier.get("set", "").lower())
+    raise ValueError(f"Unsupported identifier {identifier}")
+
+def _card_keys(card):
+    yield ("id", card["id"])
+    yield ("print", card["set"].lower(), card["collector_number"].lower())
+    # scryfall matches names against the front face too
+    for name in [card["name"]] + [face["name"] for face in card.get("card_faces", [])]:
+        yield ("name", canonic_card_name(name), "")
+        yield ("name", canonic_card_name(name), card["set"].lower())
+
+def _find_local(database, key):
+    if key[0] == "id":
+        cards = database.find(id=key[1])
+    elif key[0] == "print":
+        cards = database.find(set=key[1], collector_number=key[2])
+    elif key[2]:
+        cards = database.find(name=key[1], set=key[2])
+    else:
+        cards = database.find(name=key[1])
+    return cards[0] if cards else None
+
+def _local_database(database_name="default_cards"):
+    # whatever is already on disk, without asking scryfall if there's something newer
+    metadata = _load_metadata(database_name)
+    if metadata is None:
+        return None
+    database_path = _database_path(metadata["file_name"])
+    return CardDatabase(database_path) if database_path.is_file() else None
+
+_collection_cache = None
+_collection_cache_lock = threading.Lock()
+
+def _get_collection_cache():
+    global _collection_cache
+    if _collection_cache is None:
+        # older versions kept the whole thing in one json file, rewritten on every save
+        get_result_path("collection_cache.json").unlink(missing_ok=True)
+        _collection_cache = CollectionCache(get_result_path("collection_cache.sqlite"))
+    return _collection_cache
+
+def _fetch_collection(identifiers, chunk_size=75):
+    cards = []
+    for start in range(0, len(identifiers), chunk_size):
+        response = _api_request("POST", "https://api.scryfall.com/cards/collection", json={"identifiers": identifiers[start:start + chunk_size]})
+        response.raise_for_status()
+        cards.extend(response.json()["data"])
+    return cards
+
+def resolve_cards(identifiers, database="default_cards"):
+    """Look up many cards at once. identifiers are scryfall style ({"id": ...}, {"set": ..., "collector_number": ...}
+    or {"name": ...}), the result lines up with them and has None for cards that couldn't be found.
+
+    Uses the local database if it's been downloaded before, otherwise asks scryfall's /cards/collection,
+    so small decks don't need the whole bulk file."""
+    with tracing.span("scryfall.resolve_cards", cards=len(identifiers)):
+        return _resolve_cards(identifiers, database)
+
+def _resolve_cards(identifiers, database):
+    keys = [_identifier_key(identifier) for identifier in identifiers]
+
+    local = _local_database(database)
+    if local is not None:
+        tracing.count("scryfall.lookups", len(keys))
+        return [_find_local(local, key) for key in keys]
+
+    with _collection_cache_lock:
+        found = _get_collection_cache().get_many(keys)
+        missing = {}
+        for key, identifier in zip(keys, identifiers):
+            if key not in found and key not in missing:
+                missing[key] = identifier
+        tracing.count("scryfall.collection_cache.hits", len(keys) - len(missing))
+        tracing.count("scryfall.collection_cache.misses", len(missing))
+
+        if missing:
+            by_key = {}
+            for card in _fetch_collection(list(missing.values())):
+                card = project(card)
+                for key in _card_keys(card):
+                    by_key.setdefault(key, card)
+            fetched = {key: by_key[key] for key in missing if key in by_key}
+            _get_collection_cache().put_many(fetched)
+            found.update(fetched)
+
+        return [found.get(key) for key in keys]
+
 def get_faces(card):
     if "image_uris" in card:
         return [card]
@@ -116,18 +342,8 @@ def get_faces(card):
     else:
         raise ValueError(f"Unknown layout {card['layout']}")
 
-@memoize
-def card_by_id():
-    return {c["id"]: c for c in get_cards()}
-
-@memoize
-def cards_by_oracle_id():
-    cards_by_oracle_id = defaultdict(list)
-    for c in get_cards():
-        if "oracle_id" in c:
-            cards_by_oracle_id[c["oracle_id"]].append(c)
-        elif "card_faces" in c and "oracle_id" in c["card_faces"][0]:
-            cards_by_oracle_id[c["card_faces"][0]["oracle_id"]].append(c)
-    return cards_by_oracle_id
-
+def card_by_id(database="default_cards"):
+    return CardsBy(_get_database(database), "id")
 
+def cards_by_oracle_id(database="default_cards"):
+    return CardsBy(_get_database(database), "oracle_id", many=True)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from pathlib import Path
+import json
+import os
+import re
+
+import requests
+
+from scryfall.client import get_client
+import tracing
+
+
+class DownloadError(Exception):
+    pass
+
+class IncompleteDownload(DownloadError):
+    # what we have is fine, there just isn't all of it yet
+    pass
+
+def partial_path(dst: str | Path) -> Path:
+    dst = Path(dst)
+    return dst.with_name(dst.name + ".part")
+
+_content_range = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+def _expected_size(response, offset):
+    """Total size of the file if the response says, None if it doesn't (like compressed responses)."""
+    if response.status_code == 206:
+        match = _content_range.match(response.headers.get("content-range", ""))
+        if match is None or int(match.group(1)) != offset:
+            raise DownloadError(f"server resumed from the wrong place: {response.headers.get('content-range')}")
+        return None if match.group(3) == "*" else int(match.group(3))
+    # content-length is the size of the encoded body, not of what iter_content gives us
+    if response.headers.get("content-encoding", "identity") != "identity":
+        return None
+    length = response.headers.get("content-length")
+    return int(length) if length is not None else None
+
+def _check_json(path):
+    # parsing a few hundred MB just to check it is too slow, a truncated file won't end with its closing bracket
+    with open(path, "rb") as f:
+        start = f.read(64).lstrip()[:1]
+        f.seek(max(0, os.path.getsize(path) - 64))
+        end = f.read().rstrip()[-1:]
+    if (start, end) not in ((b"[", b"]"), (b"{", b"}")):
+        raise DownloadError("incomplete JSON")
+    if os.path.getsize(path) < 1024 * 1024:
+        with open(path, "rb") as f:
+            json.load(f)
+
+def _check_image(path):
+    from PIL import Image
+
+    # verify reads every chunk and checks its CRC without decoding the pixels
+    with Image.open(path) as im:
+        im.verify()
+
+_trailers = {
+    ".png": b"IEND\xaeB`\x82",
+    ".jpg": b"\xff\xd9",
+    ".jpeg": b"\xff\xd9",
+}
+
+def verify(path: str | Path, suffix: str | None = None) -> None:
+    """Raises DownloadError if path obviously isn't a whole image or JSON file. Other files aren't checked.
+
+    suffix says which it should be, when path is named something else like a .part file."""
+    suffix = (suffix or Path(path).suffix).lower()
+    try:
+        if suffix == ".json":
+            _check_json(path)
+        elif suffix in _trailers:
+            _check_image(path)
+    except DownloadError:
+        raise
+    except Exception as e:
+        raise DownloadError(f"{Path(path).name} is corrupt: {e}") from e
+
+def looks_complete(path: str | Path) -> bool:
+    """Cheap check for cache hits: does the file end the way a whole one would.
+    Catches files cut short by older versions, which wrote straight to the cache."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    try:
+        size = path.stat().st_size
+        if size == 0:
+            return False
+        if suffix == ".json":
+            with open(path, "rb") as f:
+                f.seek(max(0, size - 64))
+                return f.read().rstrip()[-1:] in (b"]", b"}")
+        trailer = _trailers.get(suffix)
+        if trailer is not None:
+            with open(path, "rb") as f:
+                f.seek(max(0, size - 16))
+                # jpegs are allowed some padding after the end marker
+                return trailer in f.read()
+    except OSError:
+        return False
+    return True
+
+def _fetch(url, part, chunk_size, rate_limiter):
+    offset = part.stat().st_size if part.is_file() else 0
+    request_headers = {}
+    if offset:
+        # what's in the .part file is the decoded body, so ask for the plain bytes from where we stopped.
+        # card image and bulk file urls change when their content does, so the rest belongs to the same file
+        request_headers = {"range": f"bytes={offset}-", "accept-encoding": "identity"}
+
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    with get_client().get(url, stream=True, headers=request_headers) as req:
+        if rate_limiter is not None:
+            rate_limiter.observe(req)
+        if req.status_code == 416:
+            # already have all of it (or something longer than it), start over and let verify decide
+            part.unlink(missing_ok=True)
+            raise DownloadError("partial download doesn't match the file on the server")
+        req.raise_for_status()
+        if offset and req.status_code != 206:
+            # server ignored the range
+            offset = 0
+        expected = _expected_size(req, offset)
+        if offset:
+            tracing.count("scryfall.downloads_resumed")
+
+        size = offset
+        with open(part, "ab" if offset else "wb") as f:
+            for chunk in req.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    size += len(chunk)
+                    tracing.count("scryfall.bytes_downloaded", len(chunk))
+
+    if expected is not None and size < expected:
+        raise IncompleteDownload(f"expected {expected} bytes, got {size}")
+    if expected is not None and size > expected:
+        raise DownloadError(f"expected {expected} bytes, got {size}")
+
+def download(url: str, dst: str | Path, chunk_size: int = 1024 * 64, rate_limiter=None, attempts: int = 4) -> None:
+    """Download url to dst, which only ever appears complete.
+
+    The body goes to dst.part first and is checked with verify() before being renamed into place.
+    A dropped connection picks up where it left off with a range request, and a .part left behind
+    by an earlier run is resumed the same way.
+
+    Nothing stops two downloads of the same dst from sharing the .part file, hold locks.file_lock(dst) around this.
+    """
+    dst = Path(dst)
+    part = partial_path(dst)
+    with tracing.span("scryfall.download", url=url):
+        for attempt in range(attempts):
+            try:
+                _fetch(url, part, chunk_size, rate_limiter)
+                verify(part, dst.suffix)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, DownloadError) as e:
+                if isinstance(e, DownloadError) and not isinstance(e, IncompleteDownload):
+                    # nothing left to resume, the bytes themselves are wrong
+                    part.unlink(missing_ok=True)
+                if attempt == attempts - 1:
+                    raise
+                tracing.count("scryfall.download_retries")
+        os.replace(part, dst)
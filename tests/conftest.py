@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.fixtures import make_card_pngs, make_cards
+from benchmarks.mock_scryfall import MockScryfall
+
+
+@pytest.fixture(scope="session")
+def cards():
+    return make_cards(200)
+
+@pytest.fixture(scope="session")
+def card_pngs(tmp_path_factory):
+    return make_card_pngs(tmp_path_factory.mktemp("pngs"), 4, size=(149, 208))
+
+@pytest.fixture
+def mock_scryfall(cards, card_pngs):
+    with MockScryfall(cards, card_pngs) as mock:
+        yield mock
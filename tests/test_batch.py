@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+import scryfall
+import scryfall.scryfall as scryfall_module
+from benchmarks.fixtures import card_id
+from proxygen.batch import BatchJob, load_manifest, run_batch
+from scryfall.file_cache import FileCache
+from scryfall.transfer import DownloadError
+
+
+def test_manifest_paths_are_relative_to_it(tmp_path, monkeypatch):
+    manifest = tmp_path / "decks" / "manifest.json"
+    manifest.parent.mkdir()
+    manifest.write_text(json.dumps([
+        {"deck": "a.txt", "output": "out/a.pdf", "back_output": "out/a_back.pdf"},
+        {"deck": "https://moxfield.com/decks/abc", "output": str(tmp_path / "b.pdf")},
+    ]))
+    monkeypatch.chdir(tmp_path)
+
+    assert load_manifest(manifest) == [
+        BatchJob(str(manifest.parent / "a.txt"), str(manifest.parent / "out/a.pdf"), str(manifest.parent / "out/a_back.pdf")),
+        BatchJob("https://moxfield.com/decks/abc", str(tmp_path / "b.pdf"), None),
+    ]
+
+def test_directory(tmp_path):
+    (tmp_path / "a.txt").write_text("")
+    (tmp_path / "b.csv").write_text("")
+    (tmp_path / "notes.md").write_text("")
+
+    assert load_manifest(tmp_path, "{name}.pdf", "{name}_back.pdf") == [
+        BatchJob(str(tmp_path / "a.txt"), "a.pdf", "a_back.pdf"),
+        BatchJob(str(tmp_path / "b.csv"), "b.pdf", "b_back.pdf"),
+    ]
+
+@pytest.mark.parametrize("output, back_output", [("out.pdf", None), ("{name}.pdf", "back.pdf")])
+def test_directory_needs_name(tmp_path, output, back_output):
+    (tmp_path / "a.txt").write_text("")
+    with pytest.raises(ValueError):
+        load_manifest(tmp_path, output, back_output)
+
+@pytest.fixture
+def decks(mock_scryfall, cards, tmp_path, monkeypatch):
+    scryfall.set_client(mock_scryfall.client(retries=0))
+    monkeypatch.setattr(scryfall_module, "file_cache", FileCache(tmp_path / "cache"))
+    monkeypatch.setattr(scryfall_module, "_collection_cache", None)
+    jobs = []
+    for i in (1, 2):
+        card = cards[i]
+        deck = tmp_path / f"deck{i}.txt"
+        deck.write_text(f"1 {card['name']} ({card['set'].upper()}) {card['collector_number']}\n")
+        jobs.append(BatchJob(str(deck), str(tmp_path / f"deck{i}.pdf")))
+    yield jobs
+    scryfall.set_client(scryfall.Client())
+
+def test_failed_download_only_fails_its_deck(decks, monkeypatch):
+    get_image = scryfall_module.get_image
+
+    def flaky_get_image(uri):
+        if card_id(2) in uri:
+            raise DownloadError("nope")
+        return get_image(uri)
+    monkeypatch.setattr(scryfall_module, "get_image", flaky_get_image)
+
+    failed = run_batch(decks, workers=2)
+    assert list(failed) == [decks[1].deck]
+    assert "couldn't download" in failed[decks[1].deck][0]
+    assert os.path.isfile(decks[0].output)
+    assert not os.path.exists(decks[1].output)
+
+def test_render_error_only_fails_its_deck(decks):
+    # page images need a %d in the name, a worker used to exit() over that and break the pool
+    decks[1].output = decks[1].output.replace(".pdf", ".png")
+    failed = run_batch(decks, workers=2)
+    assert list(failed) == [decks[1].deck]
+    assert os.path.isfile(decks[0].output)
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_main(*args):
+    return subprocess.run([sys.executable, "main.py", *args], cwd=root, capture_output=True, text=True)
+
+@pytest.mark.parametrize("args, message", [
+    (["--cache-max-size", "lots"], "--cache-max-size"),
+    (["--cache-max-size", "-1G"], "--cache-max-size"),
+    (["--cache-max-entries", "-3"], "--cache-max-entries"),
+    (["--cache-max-entries", "many"], "--cache-max-entries"),
+    (["--jobs", "0"], "--jobs"),
+    (["-j", "-2"], "--jobs"),
+    (["--jpeg-quality", "0"], "--jpeg-quality"),
+    (["--jpeg-quality", "200"], "--jpeg-quality"),
+])
+def test_rejects_bad_options(args, message):
+    result = run_main(*args, "--output", "out.pdf", "stitch", "card.png")
+    assert result.returncode == 2
+    assert message in result.stderr
+    assert "Traceback" not in result.stderr
+
+@pytest.mark.parametrize("command", [
+    ["batch", "manifest.json"],
+    ["serve", "--socket", "proxygen.sock"],
+])
+@pytest.mark.parametrize("workers", ["0", "-1"])
+def test_rejects_bad_workers(command, workers):
+    result = run_main(*command, "--workers", workers)
+    assert result.returncode == 2
+    assert "--workers" in result.stderr
+    assert "Traceback" not in result.stderr
+
+def test_batch_directory_needs_name(tmp_path):
+    (tmp_path / "deck.txt").write_text("")
+    result = run_main("--output", str(tmp_path / "out.pdf"), "batch", str(tmp_path))
+    assert result.returncode == 2
+    assert "{name}" in result.stderr
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,72 @@
+import io
+import json
+import time
+
+import pytest
+
+from scryfall.database import CollectionCache, iter_json_array
+
+
+def parse(text, chunk_size=3, **kwargs):
+    # small chunks so elements and separators get cut off at every possible place
+    return list(iter_json_array(io.StringIO(text), chunk_size=chunk_size, **kwargs))
+
+@pytest.mark.parametrize("text", [
+    "[]",
+    " [ ] ",
+    "[1]",
+    '[{"a": 1}, {"b": [2, 3]}]',
+    '\n[\n  {"a": 1} ,\n  "x, y",\n  12345,\n  null\n]\n',
+])
+def test_valid(text):
+    assert parse(text) == json.loads(text)
+
+def test_large_chunks():
+    cards = [{"id": str(i), "name": f"Card {i}"} for i in range(1000)]
+    assert parse(json.dumps(cards), chunk_size=1 << 20) == cards
+
+@pytest.mark.parametrize("text", [
+    '[{"a": 1} {"b": 2}]',
+    '[{"a": 1},,, {"b": 2}]',
+    '[, {"a": 1}]',
+    '[{"a": 1},]',
+    "[1 2]",
+    "[1",
+    '{"a": 1}',
+])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        parse(text)
+
+def test_garbage_is_bounded():
+    # an unterminated string swallows the rest of the file, that has to fail without reading all of it
+    class Endless:
+        def __init__(self):
+            self.read_size = 0
+
+        def read(self, n):
+            self.read_size += n
+            if self.read_size == n:
+                return '[{"a": 1}, "' + "x" * (n - 12)
+            return "x" * n
+
+    stream = Endless()
+    with pytest.raises(ValueError):
+        list(iter_json_array(stream, chunk_size=1024, max_element_size=64 * 1024))
+    assert stream.read_size <= 80 * 1024
+
+def test_collection_cache(tmp_path):
+    cache = CollectionCache(tmp_path / "collection.sqlite", max_entries=3)
+    cache.put_many({("id", "a"): {"name": "A"}, ("id", "b"): {"name": "B"}})
+    assert cache.get_many([("id", "a"), ("id", "c")]) == {("id", "a"): {"name": "A"}}
+
+    # another process sees the same entries
+    assert CollectionCache(tmp_path / "collection.sqlite").get_many([("id", "b")]) == {("id", "b"): {"name": "B"}}
+
+def test_collection_cache_is_capped(tmp_path):
+    cache = CollectionCache(tmp_path / "collection.sqlite", max_entries=3)
+    for name in "abcd":
+        cache.put_many({("name", name, ""): {"name": name}})
+        time.sleep(0.01)
+    assert len(cache) == 3
+    assert cache.get_many([("name", "a", "")]) == {}
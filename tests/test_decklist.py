@@ -0,0 +1,16 @@
+from proxygen.decklists.decklist import Decklist
+
+
+def test_extend_keeps_lookups():
+    first = Decklist()
+    first.append_card_identifier(2, {"set": "lea", "collector_number": "1"})
+    first.missing.append({"name": "Not A Card"})
+
+    merged = Decklist()
+    merged.append_card_identifier(1, {"name": "Lightning Bolt"})
+    merged.extend(first)
+
+    assert len(merged.entries) == 2
+    # resolving the merged list has to fill in the other list's entries too
+    assert [entry for entry, _ in merged.unresolved] == merged.entries
+    assert merged.missing == [{"name": "Not A Card"}]
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from proxygen.layout import make_layout
+from proxygen.units import inch, mm, page_sizes, px
+
+
+black = (0, 0, 0)
+gray = (128, 128, 128)
+
+def job_data(papersize, card_spacing, bleed, guide_mode):
+    # the same numbers print_cards works out
+    papersize = np.array(papersize)
+    cardsize = np.array([2.5 * inch, 3.5 * inch])
+    if bleed > 0:
+        container_size = cardsize + bleed * 2 + 1 * px
+        card_spacing = 0
+    else:
+        container_size = cardsize + card_spacing
+    N = np.floor(papersize / container_size).astype(int)
+    return {
+        "papersize": papersize,
+        "cardsize": cardsize,
+        "bleed": bleed,
+        "N": N,
+        "offset": (papersize - container_size * N) / 2,
+        "card_spacing": card_spacing,
+        "guide_mode": guide_mode,
+        "container_size": container_size,
+    }
+
+class Recorder:
+    def __init__(self):
+        self.lines = {black: [], gray: []}
+
+    def line(self, x1, y1, x2, y2, color):
+        self.lines[color].append((x1, y1, x2, y2))
+
+def old_draw_guide(pdf, data):
+    # draw_guide from before the layout was precomputed, line for line
+    papersize = data["papersize"]
+    N = data["N"]
+    offset = data["offset"]
+    card_spacing = data["card_spacing"]
+    guide_mode = data["guide_mode"]
+    container_size = data["container_size"]
+    row_points = []
+    col_points = []
+    move_by = data["bleed"] if data["bleed"] > 0 else card_spacing / 2
+    for x in range(0, N[0] + 1):
+        x2 = offset[0] + (container_size * x)[0]
+        if guide_mode == "edge" and move_by != 0:
+            if x == 0 or x != N[0]:
+                col_points.append(x2 + move_by)
+            if x == N[0] or x != 0:
+                col_points.append(x2 - move_by)
+        else:
+            if x == 0:
+                col_points.append(x2 + move_by)
+            elif x == N[0]:
+                col_points.append(x2 - move_by)
+            else:
+                col_points.append(x2)
+    for y in range(0, N[1] + 1):
+        y2 = offset[1] + (container_size * y)[1]
+        if guide_mode == "edge" and move_by != 0:
+            if y == 0 or y != N[1]:
+                row_points.append(y2 + move_by)
+            if y == N[1] or y != 0:
+                row_points.append(y2 - move_by)
+        else:
+            if y == 0:
+                row_points.append(y2 + move_by)
+            elif y == N[1]:
+                row_points.append(y2 - move_by)
+            else:
+                row_points.append(y2)
+    cross_size = 0.5 * mm
+    flush_offset = offset + card_spacing / 2
+    for r in row_points:
+        for c in col_points:
+            pdf.line(c - cross_size, r, c + cross_size, r, color=gray)
+            pdf.line(c, r - cross_size, c, r + cross_size, color=gray)
+    for col in col_points:
+        pdf.line(x1=col, y1=0, x2=col, y2=flush_offset[1], color=black)
+        pdf.line(col, papersize[1] - flush_offset[1], col, papersize[1], color=black)
+    for row in row_points:
+        pdf.line(0, row, flush_offset[0], row, color=black)
+        pdf.line(papersize[0] - flush_offset[0], row, papersize[0], row, color=black)
+
+def rounded(segments):
+    return sorted(tuple(round(float(v), 6) for v in segment) for segment in segments)
+
+@pytest.mark.parametrize("papersize", [page_sizes["letter"], page_sizes["a4"], page_sizes["a3"]])
+@pytest.mark.parametrize("card_spacing, bleed", [(0, 0), (0.1 * inch, 0), (0, 1 * mm)])
+@pytest.mark.parametrize("guide_mode", ["edge", "center"])
+def test_guides_match_old_lines(papersize, card_spacing, bleed, guide_mode):
+    data = job_data(papersize, card_spacing, bleed, guide_mode)
+    layout = make_layout(data)
+    old = Recorder()
+    old_draw_guide(old, data)
+    assert rounded(layout.guide_crosses) == rounded(old.lines[gray])
+    assert rounded(layout.guide_edges) == rounded(old.lines[black])
+
+@pytest.mark.parametrize("card_spacing", [0, 0.1 * inch])
+def test_slots(card_spacing):
+    data = job_data(page_sizes["letter"], card_spacing, 0, "edge")
+    layout = make_layout(data)
+    N, container_size = data["N"], data["container_size"]
+    center_by = (container_size - data["cardsize"]) / 2 if card_spacing > 0 else 0
+    for i in range(np.prod(N)):
+        x, y = i % N[0], i // N[0]
+        assert layout.slots[i] == pytest.approx(data["offset"] + container_size * np.array([x, y]) + center_by)
+        assert layout.mirrored_slots[i] == pytest.approx(data["offset"] + container_size * np.array([N[0] - (x + 1), y]) + center_by)
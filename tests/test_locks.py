@@ -0,0 +1,78 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import scryfall
+import scryfall.scryfall as scryfall_module
+from benchmarks.fixtures import _image_uris, card_id
+from benchmarks.mock_scryfall import MockClient
+from scryfall import locks
+from scryfall.file_cache import FileCache
+
+
+def test_excludes_threads(tmp_path):
+    inside = []
+    overlaps = []
+
+    def work():
+        for _ in range(20):
+            with locks.file_lock(tmp_path / "entry"):
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                time.sleep(0.0005)
+                inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+    assert locks._thread_locks == {}
+
+def test_thread_locks_are_dropped(tmp_path):
+    for i in range(100):
+        with locks.file_lock(tmp_path / f"image{i}.png"):
+            pass
+    assert locks._thread_locks == {}
+
+def test_deleted_lock_file(tmp_path):
+    with locks.file_lock(tmp_path / "entry", delete=True):
+        assert locks.lock_path(tmp_path / "entry").exists()
+    assert not locks.lock_path(tmp_path / "entry").exists()
+    with locks.file_lock(tmp_path / "entry"):
+        pass
+
+def _worker(port, directory, image_uris, results):
+    scryfall.set_client(MockClient(port))
+    scryfall_module.file_cache = FileCache(directory)
+    try:
+        cards = scryfall.get_cards(id=card_id(3))
+        paths = scryfall.get_images(image_uris)
+        results.put((len(cards), paths))
+    except Exception as e:
+        results.put(e)
+
+@pytest.mark.skipif(locks.fcntl is None, reason="needs fork")
+def test_workers_share_one_cache(mock_scryfall, tmp_path):
+    image_uris = [_image_uris(i)["png"] for i in range(1, 30)]
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=_worker, args=(mock_scryfall.port, tmp_path, image_uris, results)) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    for outcome in outcomes:
+        assert not isinstance(outcome, Exception), outcome
+        assert outcome[0] == 1
+        assert outcome == outcomes[0]
+    # everything was fetched exactly once between them
+    assert mock_scryfall.hits["bulk-data"] == 1
+    assert mock_scryfall.hits["file"] == 1
+    assert mock_scryfall.hits["png"] == len(image_uris)
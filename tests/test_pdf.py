@@ -0,0 +1,72 @@
+import re
+import zlib
+
+import pytest
+
+import proxygen.pdf as pdf_module
+import proxygen.print_cards as print_cards_module
+from proxygen.print_cards import print_cards
+from proxygen.render_cache import RenderCache
+
+
+@pytest.fixture(autouse=True)
+def render_cache(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path / "render_cache")
+    monkeypatch.setattr(print_cards_module, "render_cache", cache)
+    monkeypatch.setattr(pdf_module, "render_cache", cache)
+    return cache
+
+def check_pdf(data):
+    """Every xref entry points at its object and the page tree has every page, returns the page count."""
+    startxref = int(re.search(rb"startxref\s+(\d+)\s+%%EOF\s*$", data).group(1))
+    xref = re.match(rb"xref\s+0 (\d+)\s+", data[startxref:])
+    assert xref is not None
+    entries = data[startxref + xref.end():].split(b"\n")[:int(xref.group(1))]
+    for number, entry in enumerate(entries[1:], 1):
+        offset = int(entry[:10])
+        assert data[offset:].startswith(b"%d 0 obj" % number), number
+    pages = len(re.findall(rb"/Type /Page\b", data))
+    assert re.search(rb"/Count %d\b" % pages, data)
+    return pages
+
+def test_multi_page_pdf(tmp_path, card_pngs):
+    images = [[str(png)] for png in card_pngs] * 5
+    output = tmp_path / "cards.pdf"
+    print_cards(images, output, show_guide=True, jobs=1)
+    # 9 cards a page on letter
+    assert check_pdf(output.read_bytes()) == 3
+
+def test_buffer_matches_string(tmp_path, card_pngs, monkeypatch):
+    images = [[str(png)] for png in card_pngs] * 5
+    print_cards(images, tmp_path / "buffered.pdf", jobs=1)
+    # fpdf's own str buffer
+    monkeypatch.setattr(pdf_module, "_Buffer", str)
+    print_cards(images, tmp_path / "plain.pdf", jobs=1)
+    # same length either way, so the xref offsets still line up
+    def undated(path):
+        return re.sub(rb"/CreationDate \(D:\d+\)", b"", path.read_bytes())
+    assert undated(tmp_path / "buffered.pdf") == undated(tmp_path / "plain.pdf")
+
+def count_objects(path, subtype):
+    return len(re.findall(rb"/Subtype /" + subtype + rb"\b", path.read_bytes()))
+
+def test_images_embedded_once(tmp_path, card_pngs):
+    print_cards([[str(png)] for png in card_pngs], tmp_path / "once.pdf", jobs=1)
+    # the same file again under another name is still the same image
+    copy = tmp_path / "copy.png"
+    copy.write_bytes(card_pngs[0].read_bytes())
+    images = [[str(png)] for png in card_pngs] * 5 + [[str(copy)]]
+    print_cards(images, tmp_path / "copies.pdf", jobs=1)
+
+    once = count_objects(tmp_path / "once.pdf", b"Image")
+    assert once > 0
+    assert count_objects(tmp_path / "copies.pdf", b"Image") == once
+    assert check_pdf((tmp_path / "copies.pdf").read_bytes()) == 3
+
+def test_guides_are_one_form(tmp_path, card_pngs):
+    output = tmp_path / "guides.pdf"
+    print_cards([[str(png)] for png in card_pngs] * 5, output, show_guide=True, jobs=1)
+    assert count_objects(output, b"Form") == 1
+    # and every page draws it
+    contents = [zlib.decompress(stream) for stream in re.findall(rb"stream\n(.*?)\nendstream", output.read_bytes(), re.DOTALL)]
+    assert sum(content.count(b"/X1 Do") for content in contents) == 3
@@ -0,0 +1,19 @@
+import pytest
+
+import proxygen.print_cards as print_cards_module
+from proxygen.print_cards import print_cards
+from proxygen.render_cache import RenderCache
+
+
+@pytest.fixture(autouse=True)
+def render_cache(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path / "render_cache")
+    monkeypatch.setattr(print_cards_module, "render_cache", cache)
+    return cache
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_missing_image(tmp_path, card_pngs, jobs):
+    # a download that failed, printed anyway
+    images = [[str(card_pngs[0])], [str(tmp_path / "missing.png")], [str(card_pngs[1])]]
+    print_cards(images, tmp_path / "page%d.png", jobs=jobs)
+    assert (tmp_path / "page1.png").is_file()
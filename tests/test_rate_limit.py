@@ -0,0 +1,89 @@
+import asyncio
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import pytest
+
+import scryfall.rate_limit as rate_limit
+from scryfall.rate_limit import RateLimiter, retry_after
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    return clock
+
+def response(status, retry=None):
+    return SimpleNamespace(status_code=status, headers={} if retry is None else {"Retry-After": retry})
+
+def test_pacing(clock):
+    limiter = RateLimiter(rate=10)
+    assert [limiter.reserve() for _ in range(4)] == pytest.approx([0, 0.1, 0.2, 0.3])
+
+def test_burst(clock):
+    limiter = RateLimiter(rate=10, burst=3)
+    assert [limiter.reserve() for _ in range(5)] == pytest.approx([0, 0, 0, 0.1, 0.2])
+    # a quiet second fills the bucket back up, but no further than burst
+    clock.now += 1
+    assert [limiter.reserve() for _ in range(4)] == pytest.approx([0, 0, 0, 0.1])
+
+def test_delay(clock):
+    limiter = RateLimiter(delay=0.5)
+    assert [limiter.reserve() for _ in range(3)] == pytest.approx([0, 0.5, 1.0])
+
+def test_retry_after(clock):
+    limiter = RateLimiter(rate=10, burst=5)
+    limiter.observe(response(429, "2"))
+    # and no burst once the pause is over
+    assert [limiter.reserve() for _ in range(3)] == pytest.approx([2, 2.1, 2.2])
+    clock.now += 2.5
+    assert limiter.reserve() == pytest.approx(0)
+
+def test_429_without_retry_after(clock):
+    limiter = RateLimiter(rate=10, burst=5)
+    limiter.observe(response(429))
+    assert limiter.reserve() == pytest.approx(0.5)
+
+@pytest.mark.parametrize("status", [200, 404, 500])
+def test_other_responses_are_ignored(clock, status):
+    limiter = RateLimiter(rate=10)
+    limiter.observe(response(status, "30"))
+    assert limiter.reserve() == 0
+
+def test_retry_after_values():
+    assert retry_after("3") == 3
+    assert retry_after("-1") == 0
+    assert retry_after(None) is None
+    assert retry_after("soon") is None
+    assert retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+
+def test_acquire_waits():
+    limiter = RateLimiter(rate=20)
+    start = time.monotonic()
+    for _ in range(5):
+        with limiter:
+            pass
+    assert time.monotonic() - start >= 0.19
+
+def test_acquire_async_waits():
+    limiter = RateLimiter(rate=20)
+
+    async def use():
+        async with limiter:
+            pass
+
+    async def main():
+        await asyncio.gather(*(use() for _ in range(5)))
+
+    start = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - start >= 0.19
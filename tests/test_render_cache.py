@@ -0,0 +1,74 @@
+import os
+import shutil
+
+from PIL import Image
+
+import proxygen.render_cache as render_cache_module
+from proxygen.render_cache import RenderCache
+
+
+def count_renders(monkeypatch):
+    renders = []
+    render = render_cache_module.render
+
+    def counting(*args, **kwargs):
+        renders.append(args[0])
+        return render(*args, **kwargs)
+    monkeypatch.setattr(render_cache_module, "render", counting)
+    return renders
+
+def test_hit(tmp_path, card_pngs, monkeypatch):
+    renders = count_renders(monkeypatch)
+    cache = RenderCache(tmp_path / "renders")
+    first = cache.get(card_pngs[0], (50, 70))
+    with Image.open(first) as im:
+        assert im.size == (50, 70)
+    assert cache.get(card_pngs[0], (50, 70)) == first
+
+    # keyed by contents, not by where the file is
+    copy = tmp_path / "copy.png"
+    shutil.copy(card_pngs[0], copy)
+    assert cache.get(copy, (50, 70)) == first
+    assert len(renders) == 1
+
+    cropped = cache.get(card_pngs[0], (50, 70), crop=(5, 5, 45, 65))
+    assert cropped != first
+    with Image.open(cropped) as im:
+        assert im.size == (40, 60)
+    assert cache.get(card_pngs[0], (60, 84)) not in (first, cropped)
+    assert len(renders) == 3
+
+def test_changed_source(tmp_path, card_pngs):
+    cache = RenderCache(tmp_path / "renders")
+    source = tmp_path / "card.png"
+    shutil.copy(card_pngs[0], source)
+    os.utime(source, ns=(1, 1))
+    before = cache.get(source, (50, 70))
+    shutil.copy(card_pngs[1], source)
+    os.utime(source, ns=(2, 2))
+    assert cache.get(source, (50, 70)) != before
+
+def usage(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory))
+
+def test_evict_least_recently_used(tmp_path, card_pngs):
+    cache = RenderCache(tmp_path / "renders")
+    paths = [cache.get(png, (100, 140)) for png in card_pngs]
+    for i, path in enumerate(paths):
+        os.utime(path, (i, i))
+    # a hit counts as a use
+    assert cache.get(card_pngs[0], (100, 140)) == paths[0]
+
+    cache.max_bytes = usage(cache.directory) - 1
+    cache.evict()
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert os.path.exists(paths[-1])
+    assert usage(cache.directory) <= cache.max_bytes * 0.9
+
+def test_stays_under_max_bytes(tmp_path, card_pngs):
+    entry = os.path.getsize(RenderCache(tmp_path / "measure").get(card_pngs[0], (100, 140)))
+    cache = RenderCache(tmp_path / "renders", max_bytes=int(entry * 2.5))
+    for size in range(100, 110):
+        cache.get(card_pngs[0], (size, 140))
+        assert usage(cache.directory) <= cache.max_bytes
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+import scryfall
+import scryfall.scryfall as scryfall_module
+from benchmarks.fixtures import card_id
+from scryfall.file_cache import FileCache
+
+
+@pytest.fixture
+def cache(mock_scryfall, tmp_path, monkeypatch):
+    scryfall.set_client(mock_scryfall.client(retries=0))
+    monkeypatch.setattr(scryfall_module, "file_cache", FileCache(tmp_path))
+    monkeypatch.setattr(scryfall_module, "_collection_cache", None)
+    yield tmp_path
+    scryfall.set_client(scryfall.Client())
+
+def test_collection_cache(mock_scryfall, cache):
+    identifiers = [{"id": card_id(1)}, {"id": card_id(2)}, {"id": "nope"}]
+    cards = scryfall.resolve_cards(identifiers)
+    assert [card and card["id"] for card in cards] == [card_id(1), card_id(2), None]
+    assert mock_scryfall.hits["cards"] == 1
+
+    # a fresh process only has what's on disk
+    scryfall_module._collection_cache = None
+    assert scryfall.resolve_cards(identifiers[:2]) == cards[:2]
+    assert mock_scryfall.hits["cards"] == 1
+
+def test_old_collection_cache_is_removed(mock_scryfall, cache):
+    old = scryfall_module.get_result_path("collection_cache.json")
+    old.write_text(json.dumps([{"key": ["id", "x"], "card": {}}]))
+    scryfall.resolve_cards([{"id": card_id(1)}])
+    assert not old.exists()
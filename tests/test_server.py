@@ -0,0 +1,112 @@
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchmarks.fixtures import make_decklist
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_serve = """
+import sys
+import scryfall
+from benchmarks.mock_scryfall import MockClient
+from proxygen.server import serve
+
+scryfall.set_client(MockClient(int(sys.argv[1])))
+serve(socket_path=sys.argv[2], workers=1)
+"""
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost", timeout=60)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+@pytest.fixture
+def server(mock_scryfall, tmp_path):
+    socket_path = str(tmp_path / "proxygen.sock")
+    env = dict(os.environ, PROXYGEN_CACHE_DIR=str(tmp_path / "cache"))
+    process = subprocess.Popen([sys.executable, "-c", _serve, str(mock_scryfall.port), socket_path], cwd=root, env=env)
+    deadline = time.monotonic() + 30
+    while not os.path.exists(socket_path):
+        assert process.poll() is None, "server exited"
+        assert time.monotonic() < deadline, "server didn't start"
+        time.sleep(0.05)
+    yield socket_path
+    process.send_signal(signal.SIGINT)
+    process.wait(timeout=30)
+
+def post(socket_path, body, headers=None):
+    connection = UnixHTTPConnection(socket_path)
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+    connection.request("POST", "/render", data, {"Content-Type": "application/json", **(headers or {})})
+    response = connection.getresponse()
+    result = response.status, dict(response.getheaders()), response.read()
+    connection.close()
+    return result
+
+def test_render(server, cards):
+    status, headers, body = post(server, {"decklist": make_decklist(cards, 3, seed=1), "page_size": "a4", "guide": True})
+    assert status == 200, body
+    assert headers["Content-Type"] == "application/pdf"
+    assert body.startswith(b"%PDF")
+
+def test_health(server):
+    connection = UnixHTTPConnection(server)
+    connection.request("GET", "/health")
+    assert connection.getresponse().status == 200
+
+def test_unknown_cards(server):
+    status, _, body = post(server, {"decklist": "1 Nothing (XXX) 1\n"})
+    assert status == 422
+    assert json.loads(body)["failed"]
+
+@pytest.mark.parametrize("options", [
+    {"image_compression": "lzw"},
+    {"jpeg_quality": "high"},
+    {"jpeg_quality": 0},
+    {"jpeg_quality": 96},
+    {"jpeg_quality": True},
+    {"dfc_mode": "sideways"},
+    {"page_size": "huge"},
+])
+def test_bad_options(server, cards, options):
+    status, _, body = post(server, {"decklist": make_decklist(cards, 2), **options})
+    assert status == 400, body
+    assert "error" in json.loads(body)
+
+@pytest.mark.parametrize("url", [
+    "/etc/passwd",
+    "deck.txt",
+    "https://example.com/decks/1",
+    "https://archidekt.com.example.com/decks/1",
+    ["https://archidekt.com/decks/1"],
+])
+def test_bad_url(server, url):
+    status, _, body = post(server, {"url": url})
+    assert status == 400
+    assert "passwd" not in json.loads(body)["error"]
+
+def test_bad_json(server):
+    status, _, _ = post(server, b"{nope")
+    assert status == 400
+
+def test_too_big(server):
+    # the server answers without reading the body, so only send the headers
+    connection = UnixHTTPConnection(server)
+    connection.putrequest("POST", "/render")
+    connection.putheader("Content-Length", str((1 << 20) + 1))
+    connection.endheaders()
+    assert connection.getresponse().status == 413
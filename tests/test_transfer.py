@@ -0,0 +1,90 @@
+import pytest
+
+import scryfall
+from benchmarks.fixtures import card_id, _image_uris
+from scryfall.transfer import DownloadError, IncompleteDownload, download, looks_complete, partial_path
+
+
+@pytest.fixture
+def client(mock_scryfall):
+    scryfall.set_client(mock_scryfall.client(retries=0))
+    yield
+    scryfall.set_client(scryfall.Client())
+
+def image_url(i=1):
+    return _image_uris(i)["png"]
+
+def image(mock_scryfall, i=1):
+    return mock_scryfall.images[i % len(mock_scryfall.images)]
+
+bulk_url = "https://api.scryfall.com/file/default-cards-20240101100000.json"
+# a chunk that's cut off is lost, keep them smaller than what the mock sends before hanging up
+chunk_size = 1024
+
+def test_download(mock_scryfall, client, tmp_path):
+    dst = tmp_path / "card.png"
+    download(image_url(), dst, chunk_size=chunk_size)
+    assert dst.read_bytes() == image(mock_scryfall)
+    assert not partial_path(dst).exists()
+    assert mock_scryfall.ranges == []
+
+def test_resumes_after_dropped_connections(mock_scryfall, client, tmp_path):
+    mock_scryfall.drops = 2
+    dst = tmp_path / "default-cards.json"
+    download(bulk_url, dst, chunk_size=chunk_size)
+    assert dst.read_bytes() == mock_scryfall.bulk
+    assert not partial_path(dst).exists()
+    assert len(mock_scryfall.ranges) == 2
+    assert all(header != "bytes=0-" for header in mock_scryfall.ranges)
+
+def test_resumes_partial_from_earlier_run(mock_scryfall, client, tmp_path):
+    # both attempts get cut off, the next call doesn't
+    mock_scryfall.drops = 2
+    dst = tmp_path / "card.png"
+    with pytest.raises(Exception):
+        download(image_url(), dst, chunk_size=chunk_size, attempts=2)
+    assert not dst.exists()
+    left = partial_path(dst).stat().st_size
+    assert left > 0
+
+    download(image_url(), dst, chunk_size=chunk_size)
+    assert dst.read_bytes() == image(mock_scryfall)
+    assert mock_scryfall.ranges[-1] == f"bytes={left}-"
+
+def test_server_ignoring_range_starts_over(mock_scryfall, client, tmp_path):
+    mock_scryfall.ignore_range = True
+    mock_scryfall.drops = 1
+    dst = tmp_path / "card.png"
+    download(image_url(), dst, chunk_size=chunk_size)
+    assert dst.read_bytes() == image(mock_scryfall)
+
+def test_size_check(mock_scryfall, client, tmp_path):
+    mock_scryfall.drops = 1
+    mock_scryfall.wrong_total = 1
+    dst = tmp_path / "card.png"
+    with pytest.raises(IncompleteDownload):
+        download(image_url(), dst, chunk_size=chunk_size, attempts=2)
+    # too short isn't wrong, the rest can still come later
+    assert partial_path(dst).exists() and not dst.exists()
+
+def test_corrupt_download_is_discarded(mock_scryfall, client, tmp_path):
+    mock_scryfall.corrupt = 10
+    dst = tmp_path / "card.png"
+    with pytest.raises(DownloadError):
+        download(image_url(), dst, chunk_size=chunk_size, attempts=2)
+    assert not partial_path(dst).exists() and not dst.exists()
+
+    mock_scryfall.corrupt = 1
+    download(image_url(), dst, chunk_size=chunk_size)
+    assert dst.read_bytes() == image(mock_scryfall)
+
+def test_looks_complete(mock_scryfall, tmp_path):
+    whole = tmp_path / "whole.png"
+    whole.write_bytes(image(mock_scryfall))
+    cut = tmp_path / "cut.png"
+    cut.write_bytes(image(mock_scryfall)[:1000])
+    json_cut = tmp_path / "cut.json"
+    json_cut.write_bytes(mock_scryfall.bulk[:1000])
+    assert looks_complete(whole)
+    assert not looks_complete(cut)
+    assert not looks_complete(json_cut)
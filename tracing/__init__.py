@@ -0,0 +1,13 @@
+from tracing.tracing import Recorder, add_hook, count, enabled, remove_hook, replay, span, traced
+
+
+__all__ = [
+        "Recorder",
+        "add_hook",
+        "count",
+        "enabled",
+        "remove_hook",
+        "replay",
+        "span",
+        "traced"
+        ]
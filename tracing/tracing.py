@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from pathlib import Path
+import functools
+import threading
+import json
+import time
+import os
+
+
+# recorders and hooks currently listening, span() and count() do nothing while both are empty
+_recorders = []
+_hooks = []
+_lock = threading.Lock()
+
+def enabled() -> bool:
+    return bool(_recorders or _hooks)
+
+def _emit(kind: str, event: dict) -> None:
+    for recorder in list(_recorders):
+        recorder._add(kind, event)
+    for hook in list(_hooks):
+        hook(kind, event)
+
+def add_hook(hook) -> None:
+    """Call hook(kind, event) for everything recorded from now on. kind is "span" or "count".
+
+    Span events have name, start, duration (perf_counter seconds), pid, tid and args, count events have name, value, time and pid."""
+    with _lock:
+        _hooks.append(hook)
+
+def remove_hook(hook) -> None:
+    with _lock:
+        _hooks.remove(hook)
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _emit("span", {
+            "name": self.name,
+            "start": self.start,
+            "duration": end - self.start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": self.args,
+        })
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+_null_span = _NullSpan()
+
+def span(name: str, **args):
+    """with span("scryfall.download", url=url): ... records how long the block took."""
+    if not _recorders and not _hooks:
+        return _null_span
+    return _Span(name, args)
+
+def traced(name: str):
+    """Decorator version of span."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name: str, value: float = 1) -> None:
+    """Add value to the counter name, like cache hits or bytes downloaded."""
+    if not _recorders and not _hooks:
+        return
+    _emit("count", {"name": name, "value": value, "time": time.perf_counter(), "pid": os.getpid()})
+
+def replay(exported: dict) -> None:
+    """Record what Recorder.export() collected somewhere else, usually a worker process.
+    perf_counter is the same clock in every process, so their spans line up with ours."""
+    for event in exported["spans"]:
+        _emit("span", event)
+    for event in exported["counts"]:
+        _emit("count", event)
+
+class Recorder:
+    """Collects every span and count while active. Use as a context manager, or start() and stop()."""
+
+    def __init__(self):
+        self.spans = []
+        self.counts = []
+        self.started = None
+        self._lock = threading.Lock()
+
+    def start(self) -> Recorder:
+        self.started = time.perf_counter()
+        with _lock:
+            _recorders.append(self)
+        return self
+
+    def stop(self) -> None:
+        with _lock:
+            if self in _recorders:
+                _recorders.remove(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _add(self, kind: str, event: dict) -> None:
+        with self._lock:
+            (self.spans if kind == "span" else self.counts).append(event)
+
+    @property
+    def counters(self) -> dict[str, float]:
+        totals = {}
+        for event in self.counts:
+            totals[event["name"]] = totals.get(event["name"], 0) + event["value"]
+        return totals
+
+    def summary(self) -> dict[str, dict]:
+        """Per span name: how many, total and longest seconds."""
+        summary = {}
+        for event in self.spans:
+            entry = summary.setdefault(event["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["total_seconds"] += event["duration"]
+            entry["max_seconds"] = max(entry["max_seconds"], event["duration"])
+        return summary
+
+    def export(self) -> dict:
+        """Raw events, for replay() in another process."""
+        return {"spans": list(self.spans), "counts": list(self.counts)}
+
+    def to_json(self) -> dict:
+        return {
+            "spans": [dict(event, start=event["start"] - self.started) for event in self.spans],
+            "counters": self.counters,
+            "summary": self.summary(),
+        }
+
+    def to_chrome_trace(self) -> dict:
+        """chrome://tracing / Perfetto format."""
+        events = []
+        for event in self.spans:
+            events.append({
+                "name": event["name"],
+                "ph": "X",
+                "ts": (event["start"] - self.started) * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": event["pid"],
+                "tid": event["tid"],
+                "args": event["args"],
+            })
+        totals = {}
+        for event in sorted(self.counts, key=lambda event: event["time"]):
+            totals[event["name"]] = totals.get(event["name"], 0) + event["value"]
+            events.append({
+                "name": event["name"],
+                "ph": "C",
+                "ts": (event["time"] - self.started) * 1e6,
+                "pid": event["pid"],
+                "args": {"value": totals[event["name"]]},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str | Path, format: str = "json") -> None:
+        data = self.to_chrome_trace() if format == "chrome" else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def report(self, limit: int = 20) -> str:
+        """Human readable summary, slowest span names first."""
+        lines = [f"{'span':<32} {'count':>7} {'total':>10} {'max':>10}"]
+        summary = sorted(self.summary().items(), key=lambda item: item[1]["total_seconds"], reverse=True)
+        for name, entry in summary[:limit]:
+            lines.append(f"{name:<32} {entry['count']:>7} {entry['total_seconds']:>9.3f}s {entry['max_seconds']:>9.3f}s")
+        counters = self.counters
+        if counters:
+            lines.append("")
+            lines.append(f"{'counter':<32} {'value':>18}")
+            for name, value in sorted(counters.items()):
+                value = f"{int(value):,}" if float(value).is_integer() else f"{value:,.3f}"
+                lines.append(f"{name:<32} {value:>18}")
+        return "\n".join(lines)